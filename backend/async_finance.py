@@ -0,0 +1,103 @@
+"""Fachada assíncrona (asyncio) para o acesso aos dados.
+
+As chamadas ao DatabaseManager são executadas em um conjunto fixo de
+threads; cada thread usa a sua própria conexão do pool, então várias
+consultas podem rodar ao mesmo tempo sem bloquear o loop de eventos e sem
+criar uma thread por chamada.
+
+Uso em scripts:
+
+    async with AsyncFinance(max_workers=4) as finance:
+        balance, summary = await asyncio.gather(
+            finance.get_balance(user_id),
+            finance.get_monthly_summary(user_id, 2024, 5),
+        )
+        async for transaction in finance.iter_transactions(user_id):
+            ...
+
+Fora do asyncio (ex.: interface Qt), submit() devolve um
+concurrent.futures.Future; veja gui.workers.watch_future.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from database.db_manager import DatabaseManager
+
+
+class AsyncFinance:
+    """Versões aguardáveis (awaitable) das operações do DatabaseManager"""
+
+    def __init__(self, db_manager=None, max_workers=4):
+        self.db_manager = db_manager or DatabaseManager()
+        # O número de threads limita também as conexões abertas por esta fachada
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="finance-db")
+
+    def submit(self, method, *args, **kwargs):
+        """Agenda db_manager.<method>(*args) e retorna um concurrent.futures.Future"""
+        return self._executor.submit(getattr(self.db_manager, method), *args, **kwargs)
+
+    async def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(getattr(self.db_manager, method), *args, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    async def get_transactions(self, user_id, start_date=None, end_date=None, category_id=None):
+        return await self._run("get_transactions", user_id, start_date, end_date, category_id)
+
+    async def get_transactions_page(self, user_id, after=None, limit=100, start_date=None, end_date=None,
+                                    category_id=None):
+        return await self._run("get_transactions_page", user_id, after, limit, start_date, end_date, category_id)
+
+    async def search_transactions(self, user_id, query, start_date=None, end_date=None, category_id=None,
+                                  limit=100):
+        return await self._run("search_transactions", user_id, query, start_date, end_date, category_id, limit)
+
+    async def iter_transactions(self, user_id, start_date=None, end_date=None, category_id=None, page_size=500):
+        """Percorre as transações em páginas, sem carregar o resultado inteiro na memória"""
+        after = None
+        while True:
+            page = await self.get_transactions_page(user_id, after, page_size, start_date, end_date, category_id)
+            for transaction in page["transactions"]:
+                yield transaction
+            after = page["next"]
+            if after is None:
+                break
+
+    async def get_balance(self, user_id, start_date=None, end_date=None):
+        return await self._run("get_balance", user_id, start_date, end_date)
+
+    async def get_monthly_summary(self, user_id, year, month):
+        return await self._run("get_monthly_summary", user_id, year, month)
+
+    async def get_yearly_summary(self, user_id, year):
+        return await self._run("get_yearly_summary", user_id, year)
+
+    async def get_categories(self, user_id=None, type_=None):
+        return await self._run("get_categories", user_id, type_)
+
+    async def add_transaction(self, user_id, date, amount, description, category_id):
+        return await self._run("add_transaction", user_id, date, amount, description, category_id)
+
+    async def add_transactions(self, user_id, rows, chunk_size=500):
+        # A lista é materializada aqui: um iterador não pode ser consumido em outra thread
+        return await self._run("add_transactions", user_id, list(rows), chunk_size)
+
+    async def import_from_csv(self, user_id, file_path, skip_duplicates=True):
+        return await self._run("import_from_csv", user_id, file_path, skip_duplicates=skip_duplicates)
+
+    async def export_to_csv(self, user_id, file_path, start_date=None, end_date=None, compress=None):
+        return await self._run("export_to_csv", user_id, file_path, start_date, end_date, compress)
+
+    def close(self):
+        """Aguarda as chamadas em andamento e encerra as threads"""
+        self._executor.shutdown(wait=True)
+
+    async def aclose(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
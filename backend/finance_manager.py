@@ -1,29 +1,94 @@
+import threading
 from database.db_manager import DatabaseManager
+from backend.ledger_index import LedgerIndex
+from ults.helpers import date_to_day, to_cents, from_cents
 import datetime
 import calendar
-import matplotlib.pyplot as plt
 import io
-import numpy as np
-from PyQt5.QtGui import QPixmap
-from PyQt5.QtCore import QByteArray, QBuffer
+
+# matplotlib e PyQt5 são importados dentro dos métodos de gráfico, para que o
+# modo servidor (server.py) funcione sem as dependências da interface gráfica
 
 class FinanceManager:
+    # Lotes até este tamanho atualizam o índice de saldos linha a linha
+    LEDGER_UPDATE_LIMIT = 1000
+    
     def __init__(self, user_id=None):
         self.db_manager = DatabaseManager()
         self.user_id = user_id
+        
+        # Catálogo de categorias em memória: user_id -> {tipo: [categorias]}
+        self._category_cache = {}
+        
+        # Índice de saldos por dia em memória: user_id -> LedgerIndex
+        self._ledgers = {}
+        
+        # Protege os caches acima quando a instância é usada por várias threads
+        # (ex.: interface + fila de gravação); o banco não é acessado com ele
+        self._cache_lock = threading.RLock()
     
     def set_user(self, user_id):
         """Define o usuário atual"""
         self.user_id = user_id
     
     def add_transaction(self, date, amount, description, category_id):
-        """Adiciona uma nova transação"""
+        """Adiciona uma nova transação (amount em reais: Decimal, str ou número)"""
         if not self.user_id:
             return False
         
-        return self.db_manager.add_transaction(
-            self.user_id, date, amount, description, category_id
+        user_id = self.user_id
+        ledger = self._peek_ledger(user_id)
+        transaction_id = self.db_manager.add_transaction(
+            user_id, date, amount, description, category_id
         )
+        self._apply_to_ledger(user_id, ledger, [(date, amount, category_id)])
+        return transaction_id
+    
+    def add_transactions(self, rows, chunk_size=500):
+        """Adiciona várias transações de uma vez; retorna os novos ids"""
+        if not self.user_id:
+            return []
+        
+        user_id = self.user_id
+        ledger = self._peek_ledger(user_id)
+        new_ids = self.db_manager.add_transactions(user_id, rows, chunk_size)
+        
+        if not isinstance(rows, (list, tuple)) or len(rows) > self.LEDGER_UPDATE_LIMIT:
+            # Em lotes grandes é mais barato recriar o índice a partir do resumo diário
+            self._drop_ledger(user_id)
+            return new_ids
+        
+        movements = []
+        for row in rows:
+            if isinstance(row, dict):
+                movements.append((row["date"], row["amount"], row["category_id"]))
+            else:
+                date, amount, _, category_id = row
+                movements.append((date, amount, category_id))
+        self._apply_to_ledger(user_id, ledger, movements)
+        
+        return new_ids
+    
+    def delete_transactions(self, transaction_ids):
+        """Exclui transações do usuário atual; retorna quantas foram excluídas"""
+        if not self.user_id:
+            return 0
+        
+        user_id = self.user_id
+        ledger = self._peek_ledger(user_id)
+        deleted = self.db_manager.delete_transactions(user_id, transaction_ids)
+        if deleted is False:
+            return 0
+        
+        movements = []
+        for transaction in deleted:
+            amount = transaction["amount_cents"]
+            if transaction["category_type"] == "income":
+                amount = -amount
+            movements.append((transaction["day"], amount))
+        self._apply_to_ledger(user_id, ledger, movements, signed=True)
+        
+        return len(deleted)
     
     def get_transactions(self, start_date=None, end_date=None, category_id=None):
         """Obtém transações do usuário"""
@@ -34,16 +99,161 @@ class FinanceManager:
             self.user_id, start_date, end_date, category_id
         )
     
+    def get_transactions_page(self, after=None, limit=100, start_date=None, end_date=None, category_id=None):
+        """Obtém uma página de transações e o token da próxima página"""
+        if not self.user_id:
+            return {"transactions": [], "next": None}
+        
+        return self.db_manager.get_transactions_page(
+            self.user_id, after, limit, start_date, end_date, category_id
+        )
+    
+    def search_transactions(self, query, start_date=None, end_date=None, category_id=None, limit=100):
+        """Busca transações do usuário pela descrição"""
+        if not self.user_id:
+            return []
+        
+        return self.db_manager.search_transactions(
+            self.user_id, query, start_date, end_date, category_id, limit
+        )
+    
     def get_categories(self, type_=None):
-        """Obtém categorias disponíveis"""
-        return self.db_manager.get_categories(self.user_id, type_)
+        """Obtém categorias disponíveis (do cache em memória)"""
+        catalog = self._get_category_catalog()
+        
+        if type_:
+            return list(catalog.get(type_, []))
+        
+        return [category for categories in catalog.values() for category in categories]
+    
+    def get_category_maps(self):
+        """Retorna os mapas id -> nome e (nome, tipo) -> id das categorias"""
+        id_to_name = {}
+        name_to_id = {}
+        for category in self.get_categories():
+            id_to_name[category["id"]] = category["name"]
+            name_to_id[(category["name"], category["type"])] = category["id"]
+        
+        return id_to_name, name_to_id
+    
+    def add_category(self, name, type_):
+        """Cadastra uma categoria para o usuário atual"""
+        if not self.user_id:
+            return None
+        
+        category_id = self.db_manager.add_category(self.user_id, name, type_)
+        self.invalidate_categories()
+        return category_id
+    
+    def _get_ledger(self, user_id):
+        """Índice de saldos do usuário, criado a partir do banco uma única vez"""
+        ledger = self._peek_ledger(user_id)
+        if ledger is None:
+            ledger = LedgerIndex(self.db_manager.get_daily_net(user_id))
+            with self._cache_lock:
+                # Outra thread pode ter criado (ou descartado) o índice enquanto isso
+                ledger = self._ledgers.setdefault(user_id, ledger)
+        
+        return ledger
+    
+    def _peek_ledger(self, user_id):
+        """Índice de saldos do usuário, se já estiver em memória"""
+        with self._cache_lock:
+            return self._ledgers.get(user_id)
+    
+    def _apply_to_ledger(self, user_id, ledger, movements, signed=False):
+        """Aplica ao índice os lançamentos que acabaram de ser gravados.
+        
+        ledger é o índice capturado antes da gravação: se outro índice foi
+        criado nesse intervalo, ele pode já conter os lançamentos e é
+        descartado. movements são (data, valor em reais, categoria) ou, com
+        signed=True, (dia, centavos com sinal).
+        """
+        if ledger is None:
+            return
+        
+        if not signed:
+            types = {category["id"]: category["type"] for category in self.get_categories()}
+            converted = []
+            for date, amount, category_id in movements:
+                if category_id not in types:
+                    # Categoria desconhecida no catálogo em cache: recria o índice depois
+                    self._drop_ledger(user_id)
+                    return
+                cents = to_cents(amount)
+                converted.append((date_to_day(date), cents if types[category_id] == "income" else -cents))
+            movements = converted
+        
+        with self._cache_lock:
+            if self._ledgers.get(user_id) is not ledger:
+                self._ledgers.pop(user_id, None)
+                return
+            for day, cents in movements:
+                ledger.add(day, cents)
+    
+    def _drop_ledger(self, user_id):
+        with self._cache_lock:
+            self._ledgers.pop(user_id, None)
+    
+    def invalidate_ledger(self):
+        """Descarta o índice de saldos do usuário atual (recriado sob demanda)"""
+        self._drop_ledger(self.user_id)
+    
+    def invalidate_categories(self):
+        """Descarta o catálogo de categorias em cache do usuário atual"""
+        with self._cache_lock:
+            self._category_cache.pop(self.user_id, None)
+    
+    def _get_category_catalog(self):
+        """Carrega o catálogo de categorias do usuário uma única vez"""
+        user_id = self.user_id
+        with self._cache_lock:
+            catalog = self._category_cache.get(user_id)
+        
+        if catalog is None:
+            catalog = {"income": [], "expense": []}
+            for category in self.db_manager.get_categories(user_id):
+                catalog.setdefault(category["type"], []).append(category)
+            with self._cache_lock:
+                catalog = self._category_cache.setdefault(user_id, catalog)
+        
+        return catalog
     
     def get_balance(self, start_date=None, end_date=None):
-        """Obtém o saldo atual"""
+        """Obtém o saldo atual (ou a variação do saldo no período)"""
         if not self.user_id:
             return 0
         
-        return self.db_manager.get_balance(self.user_id, start_date, end_date)
+        # Com o índice de saldos já em memória a resposta não toca o banco;
+        # sem ele, o banco responde pelos pontos de controle mensais
+        ledger = self._peek_ledger(self.user_id)
+        if ledger is None:
+            return self.db_manager.get_balance(self.user_id, start_date, end_date)
+        
+        with self._cache_lock:
+            return from_cents(ledger.net_change(
+                date_to_day(start_date) if start_date else None,
+                date_to_day(end_date) if end_date else None
+            ))
+    
+    def get_daily_balances(self, start_date, end_date, cumulative=True):
+        """Saldo ao fim de cada dia do período (Decimal), do índice em memória.
+        
+        Com cumulative=False os valores partem de zero no início do período
+        (variação acumulada no período).
+        """
+        if not self.user_id:
+            return []
+        
+        ledger = self._get_ledger(self.user_id)
+        first_day = date_to_day(start_date)
+        
+        with self._cache_lock:
+            base = 0 if cumulative else ledger.balance_as_of(first_day - 1)
+            return [
+                from_cents(ledger.balance_as_of(day) - base)
+                for day in range(first_day, date_to_day(end_date) + 1)
+            ]
     
     def get_monthly_summary(self, year=None, month=None):
         """Obtém o resumo mensal"""
@@ -57,33 +267,63 @@ class FinanceManager:
         
         return self.db_manager.get_monthly_summary(self.user_id, year, month)
     
-    def export_to_csv(self, file_path, start_date=None, end_date=None):
-        """Exporta transações para CSV"""
+    def get_yearly_summary(self, year=None):
+        """Obtém os resumos de todos os meses do ano"""
+        if not self.user_id:
+            return None
+        
+        if year is None:
+            year = datetime.date.today().year
+        
+        return self.db_manager.get_yearly_summary(self.user_id, year)
+    
+    def export_to_csv(self, file_path, start_date=None, end_date=None, compress=None):
+        """Exporta transações para CSV (compactado com gzip se terminar em .gz)"""
         if not self.user_id:
             return False
         
-        return self.db_manager.export_to_csv(self.user_id, file_path, start_date, end_date)
+        return self.db_manager.export_to_csv(self.user_id, file_path, start_date, end_date, compress)
     
-    def import_from_csv(self, file_path):
-        """Importa transações de CSV"""
+    def import_from_csv(self, file_path, progress_callback=None, skip_duplicates=True):
+        """Importa transações de CSV; retorna o relatório da importação"""
         if not self.user_id:
             return False
         
-        return self.db_manager.import_from_csv(self.user_id, file_path)
+        report = self.db_manager.import_from_csv(
+            self.user_id, file_path, progress_callback=progress_callback,
+            skip_duplicates=skip_duplicates
+        )
+        
+        # A importação pode ter criado categorias novas
+        if report and report["created_categories"]:
+            self.invalidate_categories()
+        if report and report["imported"]:
+            self.invalidate_ledger()
+        
+        return report
     
-    def backup_data(self, backup_path):
-        """Cria um backup do banco de dados"""
-        return self.db_manager.backup_data(backup_path)
+    def backup_data(self, backup_path, progress_callback=None):
+        """Cria um backup do banco de dados (no modo particionado, só do usuário atual)"""
+        return self.db_manager.backup_user_data(self.user_id, backup_path, progress_callback)
     
-    def restore_backup(self, backup_path):
+    def restore_backup(self, backup_path, progress_callback=None):
         """Restaura um backup do banco de dados"""
-        return self.db_manager.restore_backup(backup_path)
+        restored = self.db_manager.restore_user_data(self.user_id, backup_path, progress_callback)
+        if restored:
+            # Os dados em memória refletiam o banco anterior
+            with self._cache_lock:
+                self._category_cache.clear()
+                self._ledgers.clear()
+        return restored
     
     def generate_performance_chart(self, year, month, theme="light"):
         """Gera um gráfico de desempenho diário"""
         if not self.user_id:
             return None
         
+        import matplotlib.pyplot as plt
+        from PyQt5.QtGui import QPixmap
+        
         # Configura cores baseadas no tema
         if theme == "dark":
             plt.style.use('dark_background')
@@ -103,28 +343,12 @@ class FinanceManager:
         start_date = f"{year}-{month:02d}-01"
         end_date = f"{year}-{month:02d}-{num_days:02d}"
         
-        # Obtém as transações do mês
-        transactions = self.get_transactions(start_date, end_date)
-        
-        # Organiza as transações por dia
-        daily_balance = {}
-        for day in range(1, num_days + 1):
-            daily_balance[day] = 0
-        
-        # Calcula o saldo acumulado para cada dia
-        accumulated = 0
-        for transaction in transactions:
-            day = int(transaction['date'].split('-')[2])
-            amount = transaction['amount']
-            if transaction['category_type'] == 'expense':
-                amount = -amount
-            
-            accumulated += amount
-            daily_balance[day] = accumulated
+        # Saldo acumulado no mês ao fim de cada dia, lido do índice de saldos
+        daily_balance = self.get_daily_balances(start_date, end_date, cumulative=False)
         
         # Prepara os dados para o gráfico
-        days = list(daily_balance.keys())
-        balances = list(daily_balance.values())
+        days = list(range(1, num_days + 1))
+        balances = [float(balance) for balance in daily_balance]
         
         # Cria o gráfico
         plt.figure(figsize=(10, 4))
@@ -168,6 +392,9 @@ class FinanceManager:
         if not self.user_id:
             return None, None
         
+        import matplotlib.pyplot as plt
+        from PyQt5.QtGui import QPixmap
+        
         # Configura cores baseadas no tema
         if theme == "dark":
             plt.style.use('dark_background')
@@ -192,7 +419,7 @@ class FinanceManager:
             plt.figure(figsize=(6, 6))
             
             labels = [item['name'] for item in summary['income']['categories']]
-            values = [item['total'] for item in summary['income']['categories']]
+            values = [float(item['total']) for item in summary['income']['categories']]
             
             plt.pie(values, labels=labels, autopct='%1.1f%%', startangle=90, colors=colors_income)
             plt.axis('equal')
@@ -215,7 +442,7 @@ class FinanceManager:
             plt.figure(figsize=(6, 6))
             
             labels = [item['name'] for item in summary['expense']['categories']]
-            values = [item['total'] for item in summary['expense']['categories']]
+            values = [float(item['total']) for item in summary['expense']['categories']]
             
             plt.pie(values, labels=labels, autopct='%1.1f%%', startangle=90, colors=colors_expense)
             plt.axis('equal')
@@ -239,6 +466,9 @@ class FinanceManager:
         if not self.user_id:
             return None
         
+        import matplotlib.pyplot as plt
+        from PyQt5.QtGui import QPixmap
+        
         # Configura cores baseadas no tema
         if theme == "dark":
             plt.style.use('dark_background')
@@ -257,6 +487,7 @@ class FinanceManager:
         # Prepara as datas para o mês
         start_date = f"{year}-{month:02d}-01"
         end_date = f"{year}-{month:02d}-{num_days:02d}"
+        first_day = date_to_day(start_date)
         
         # Obtém as transações do mês
         transactions = self.get_transactions(start_date, end_date)
@@ -270,18 +501,18 @@ class FinanceManager:
         
         # Calcula receitas e despesas para cada dia
         for transaction in transactions:
-            day = int(transaction['date'].split('-')[2])
-            amount = transaction['amount']
+            day = transaction['day'] - first_day + 1
+            amount = transaction['amount_cents']
             
             if transaction['category_type'] == 'income':
                 daily_income[day] += amount
             else:  # expense
                 daily_expense[day] += amount
         
-        # Prepara os dados para o gráfico
+        # Prepara os dados para o gráfico (centavos -> reais)
         days = list(range(1, num_days + 1))
-        income_values = [daily_income[day] for day in days]
-        expense_values = [daily_expense[day] for day in days]
+        income_values = [daily_income[day] / 100 for day in days]
+        expense_values = [daily_expense[day] / 100 for day in days]
         
         # Cria o gráfico
         plt.figure(figsize=(10, 4))
@@ -0,0 +1,562 @@
+"""Servidor HTTP/JSON local (modo sem interface gráfica).
+
+Permite que vários clientes (interfaces, scripts) usem o mesmo banco por
+meio de um único processo, em vez de abrirem o arquivo SQLite cada um. As
+requisições são atendidas por um conjunto fixo de threads; cada thread
+mantém a sua conexão do pool, reaproveitada entre as requisições. Entre uma
+requisição e outra, as conexões HTTP reaproveitáveis (keep-alive) aguardam
+em um seletor, sem ocupar uma thread.
+
+O servidor escuta apenas em 127.0.0.1. Rotas (corpo e respostas em JSON,
+valores em reais como texto, ex.: "12.50"):
+
+    POST   /login                  {"username", "password"} -> {"token", "user"}
+    POST   /logout
+    GET    /categories             ?type=income|expense
+    POST   /categories             {"name", "type"}
+    GET    /transactions           ?start_date&end_date&category_id&after&limit
+    GET    /transactions/search    ?q&start_date&end_date&category_id&limit
+    POST   /transactions           {"date", "amount", "description", "category_id"}
+                                   ou {"transactions": [...]}
+    DELETE /transactions           {"ids": [...]}
+    GET    /balance                ?start_date&end_date
+    GET    /summary/monthly        ?year&month
+    GET    /summary/yearly         ?year
+    GET    /export                 ?start_date&end_date  (resposta em CSV)
+    POST   /import                 corpo em CSV; ?skip_duplicates=0 para importar repetidas
+    GET    /metrics                estatísticas das requisições (e do banco, se instrumentado)
+    GET    /health
+
+Exceto /login, /health e /metrics, as rotas exigem o cabeçalho
+"Authorization: Bearer <token>".
+"""
+
+import json
+import os
+import secrets
+import selectors
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from backend.finance_manager import FinanceManager
+from database.db_manager import DatabaseManager
+from database.instrumentation import LatencyStats, get_report, is_enabled as instrumentation_enabled
+
+
+class ApiError(Exception):
+    """Erro com status HTTP, devolvido ao cliente como {"error": mensagem}"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class FinanceServer(HTTPServer):
+    """Servidor HTTP com um conjunto fixo de threads de atendimento"""
+
+    # Conexões abertas (em atendimento, aguardando uma thread ou ociosas entre
+    # requisições); acima disso o servidor responde 503
+    MAX_CONNECTIONS = 256
+
+    # Conexões ociosas por mais que isto (segundos) entre requisições são fechadas
+    IDLE_TIMEOUT = 15
+
+    # Tempo (em segundos) sem uso após o qual a sessão expira
+    SESSION_TTL = 8 * 3600
+
+    def __init__(self, port=8765, workers=8):
+        super().__init__(("127.0.0.1", port), FinanceRequestHandler)
+        self.db_manager = DatabaseManager()
+        self.db_manager.setup_database()
+
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="finance-http")
+        self._slots = threading.BoundedSemaphore(self.MAX_CONNECTIONS)
+
+        self._lock = threading.Lock()
+        self._sessions = {}  # token -> [user_id, último uso]
+        self._managers = {}  # user_id -> FinanceManager (compartilhado pelas threads)
+        self._route_stats = {}  # "GET /balance" -> LatencyStats
+        self._status_counts = {}  # status HTTP -> quantidade
+        self._rejected = 0
+        self.started_at = time.time()
+
+        # Conexões ociosas ficam em um seletor, acompanhado por uma thread
+        # própria, e voltam ao conjunto de threads quando chega a próxima requisição
+        self._idle = selectors.DefaultSelector()
+        self._parked = []  # handlers devolvidos pelas threads, ainda fora do seletor
+        self._stopping = False
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._idle.register(self._wakeup_r, selectors.EVENT_READ)
+        self._idle_thread = threading.Thread(target=self._watch_idle, name="finance-http-idle", daemon=True)
+        self._idle_thread.start()
+
+    def process_request(self, request, client_address):
+        """Entrega a conexão a uma thread do conjunto (em vez de criar uma nova)"""
+        if not self._slots.acquire(blocking=False):
+            # Servidor sobrecarregado: recusa em vez de acumular conexões
+            with self._lock:
+                self._rejected += 1
+            try:
+                request.sendall(b"HTTP/1.1 503 Service Unavailable\r\n"
+                                b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self._executor.submit(self._serve, request, client_address)
+
+    def _serve(self, request, client_address, handler=None):
+        """Atende as requisições já recebidas na conexão; depois a devolve ao seletor"""
+        try:
+            if handler is None:
+                handler = self.RequestHandlerClass(request, client_address, self)
+            while True:
+                handler.handle()
+                if handler.close_connection:
+                    break
+                if not handler.has_pending_input():
+                    self._park(handler)
+                    return
+        except Exception:
+            self.handle_error(request, client_address)
+        self._close(request, handler)
+
+    def _close(self, request, handler=None):
+        """Fecha a conexão e libera a vaga dela"""
+        try:
+            if handler is not None:
+                handler.finish()
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def _park(self, handler):
+        """Devolve uma conexão ociosa ao seletor, liberando a thread"""
+        with self._lock:
+            stopping = self._stopping
+            if not stopping:
+                self._parked.append(handler)
+        if stopping:
+            self._close(handler.connection, handler)
+        else:
+            self._wake()
+
+    def _wake(self):
+        try:
+            self._wakeup_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            # Buffer cheio: a thread do seletor já tem um aviso pendente
+            pass
+
+    def _watch_idle(self):
+        """Thread do seletor: reenvia conexões com nova requisição e fecha as ociosas demais"""
+        idle_since = {}  # handler -> instante em que a conexão ficou ociosa
+        while True:
+            events = self._idle.select(timeout=1)
+            with self._lock:
+                parked, self._parked = self._parked, []
+                stopping = self._stopping
+            if stopping:
+                break
+
+            now = time.monotonic()
+            for handler in parked:
+                self._idle.register(handler.connection, selectors.EVENT_READ, handler)
+                idle_since[handler] = now
+
+            for key, _ in events:
+                if key.fileobj is self._wakeup_r:
+                    try:
+                        while self._wakeup_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                handler = key.data
+                self._idle.unregister(key.fileobj)
+                del idle_since[handler]
+                self._executor.submit(self._serve, handler.connection, handler.client_address, handler)
+
+            for handler, since in list(idle_since.items()):
+                if now - since > self.IDLE_TIMEOUT:
+                    self._idle.unregister(handler.connection)
+                    del idle_since[handler]
+                    self._close(handler.connection, handler)
+
+        # Encerramento do servidor: fecha as conexões ociosas
+        for handler in list(idle_since) + parked:
+            self._close(handler.connection, handler)
+
+    def server_close(self):
+        """Aguarda as requisições em andamento e fecha o socket e as conexões ociosas"""
+        super().server_close()
+        with self._lock:
+            self._stopping = True
+        self._wake()
+        self._idle_thread.join()
+        self._executor.shutdown(wait=True)
+        self._idle.close()
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+    def login(self, username, password):
+        """Autentica o usuário e abre uma sessão; retorna (token, usuário) ou None"""
+        user = self.db_manager.authenticate_user(username, password)
+        if not user:
+            return None
+
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._sessions[token] = [user["id"], time.monotonic()]
+        return token, user
+
+    def logout(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def finance_manager(self, token):
+        """FinanceManager do usuário da sessão, ou None se a sessão não for válida"""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            if now - session[1] > self.SESSION_TTL:
+                del self._sessions[token]
+                return None
+            session[1] = now
+
+            user_id = session[0]
+            manager = self._managers.get(user_id)
+            if manager is None:
+                manager = self._managers[user_id] = FinanceManager(user_id)
+            return manager
+
+    def record(self, route, status, elapsed):
+        """Registra a latência e o status de uma requisição"""
+        with self._lock:
+            stats = self._route_stats.get(route)
+            if stats is None:
+                stats = self._route_stats[route] = LatencyStats()
+            stats.add(elapsed)
+            self._status_counts[status] = self._status_counts.get(status, 0) + 1
+
+    def get_metrics(self):
+        """Estatísticas das requisições desde o início do servidor"""
+        with self._lock:
+            routes = {route: stats.as_dict() for route, stats in self._route_stats.items()}
+            metrics = {
+                "uptime_s": round(time.time() - self.started_at, 1),
+                "requests": sum(stats["count"] for stats in routes.values()),
+                "rejected": self._rejected,
+                "sessions": len(self._sessions),
+                "status": {str(status): count for status, count in sorted(self._status_counts.items())},
+                "routes": dict(sorted(routes.items(), key=lambda item: item[1]["total_ms"], reverse=True)),
+            }
+
+        # Tempos por método e por instrução SQL (ver database.instrumentation)
+        if instrumentation_enabled():
+            metrics["database"] = get_report()
+        return metrics
+
+
+class FinanceRequestHandler(BaseHTTPRequestHandler):
+    """Uma conexão; com HTTP/1.1 o cliente pode reaproveitá-la entre requisições.
+
+    Ao contrário do handler padrão, o construtor apenas prepara a conexão e
+    handle() atende uma única requisição: entre as requisições o servidor
+    mantém a conexão no seletor, sem ocupar uma thread (ver FinanceServer._serve).
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    # Cabeçalhos e corpo são escritos separadamente; sem isto o algoritmo de
+    # Nagle atrasa cada resposta em conexões reaproveitadas
+    disable_nagle_algorithm = True
+
+    # Espera máxima (segundos) por dados no meio de uma requisição
+    timeout = 15
+
+    # Tamanho máximo do corpo das requisições (ex.: CSV importado)
+    MAX_BODY = 50 * 1024 * 1024
+
+    ROUTES = {
+        ("POST", "/login"): "login",
+        ("POST", "/logout"): "logout",
+        ("GET", "/categories"): "get_categories",
+        ("POST", "/categories"): "add_category",
+        ("GET", "/transactions"): "get_transactions",
+        ("GET", "/transactions/search"): "search_transactions",
+        ("POST", "/transactions"): "add_transactions",
+        ("DELETE", "/transactions"): "delete_transactions",
+        ("GET", "/balance"): "get_balance",
+        ("GET", "/summary/monthly"): "get_monthly_summary",
+        ("GET", "/summary/yearly"): "get_yearly_summary",
+        ("GET", "/export"): "export_to_csv",
+        ("POST", "/import"): "import_from_csv",
+        ("GET", "/metrics"): "get_metrics",
+        ("GET", "/health"): "health",
+    }
+
+    def __init__(self, request, client_address, server):
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.setup()
+
+    def handle(self):
+        """Atende uma requisição; close_connection indica se a conexão deve ser fechada"""
+        self.close_connection = True
+        self.handle_one_request()
+
+    def has_pending_input(self):
+        """Indica, sem bloquear, se a próxima requisição já chegou (ex.: enviada em sequência)"""
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query)
+        name = self.ROUTES.get((method, url.path))
+
+        try:
+            # O corpo é sempre lido, mesmo quando a requisição é recusada, para
+            # que a próxima requisição na mesma conexão comece no ponto certo
+            self.body = self._read_body()
+            if name is None:
+                raise ApiError(404, "Rota não encontrada")
+            status = self._send(*getattr(self, f"handle_{name}")())
+        except ApiError as e:
+            status = self._send(e.status, {"error": str(e)})
+        except (ValueError, sqlite3.IntegrityError) as e:
+            status = self._send(400, {"error": str(e)})
+        except Exception as e:
+            print(f"Erro ao atender {method} {url.path}: {e}")
+            status = self._send(500, {"error": "Erro interno do servidor"})
+
+        route = f"{method} {url.path}" if name else f"{method} (desconhecida)"
+        self.server.record(route, status, time.perf_counter() - start)
+
+    def _send(self, status, payload):
+        """Envia a resposta: objetos em JSON, arquivos (Path) em CSV"""
+        if isinstance(payload, Path):
+            # Arquivo temporário gerado pela exportação: enviado em partes e removido
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "text/csv; charset=utf-8")
+                self.send_header("Content-Length", str(os.path.getsize(payload)))
+                self.end_headers()
+                with open(payload, "rb") as f:
+                    shutil.copyfileobj(f, self.wfile)
+            finally:
+                os.unlink(payload)
+            return status
+
+        body = json.dumps(payload, default=_json_default, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return status
+
+    def _read_body(self):
+        """Corpo da requisição em bytes"""
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > self.MAX_BODY:
+            # O corpo não será lido: a conexão não pode ser reaproveitada
+            self.close_connection = True
+            raise ApiError(413, "Corpo da requisição muito grande")
+        return self.rfile.read(length)
+
+    def _json(self):
+        """Corpo da requisição em JSON; números com casas decimais viram Decimal"""
+        try:
+            data = json.loads(self.body or b"{}", parse_float=Decimal)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ApiError(400, f"JSON inválido: {e}")
+        if not isinstance(data, dict):
+            raise ApiError(400, "O corpo deve ser um objeto JSON")
+        return data
+
+    def _param(self, name, type_=str, default=None):
+        """Parâmetro da URL (?name=valor) convertido para type_"""
+        values = self.query.get(name)
+        if not values or values[0] == "":
+            return default
+        try:
+            return type_(values[0])
+        except ValueError:
+            raise ApiError(400, f"Parâmetro inválido: {name}")
+
+    def _finance(self):
+        """FinanceManager do usuário autenticado pelo cabeçalho Authorization"""
+        manager = self.server.finance_manager(self._token())
+        if manager is None:
+            raise ApiError(401, "Sessão inválida ou expirada")
+        return manager
+
+    def _token(self):
+        scheme, _, token = (self.headers.get("Authorization") or "").partition(" ")
+        return token.strip() if scheme.lower() == "bearer" else ""
+
+    def _limit(self):
+        """Parâmetro limit, restrito ao intervalo de 1 a 1000"""
+        return max(1, min(self._param("limit", int, 100), 1000))
+
+    def _period(self):
+        return self._param("start_date"), self._param("end_date")
+
+    def handle_login(self):
+        data = self._json()
+        result = self.server.login(str(data.get("username", "")), str(data.get("password", "")))
+        if result is None:
+            raise ApiError(401, "Usuário ou senha inválidos")
+        token, user = result
+        return 200, {"token": token, "user": {"id": user["id"], "username": user["username"],
+                                              "full_name": user["full_name"]}}
+
+    def handle_logout(self):
+        self.server.logout(self._token())
+        return 200, {"ok": True}
+
+    def handle_get_categories(self):
+        return 200, self._finance().get_categories(self._param("type"))
+
+    def handle_add_category(self):
+        data = self._json()
+        if data.get("type") not in ("income", "expense") or not data.get("name"):
+            raise ApiError(400, "Informe name e type (income ou expense)")
+        category_id = self._finance().add_category(data["name"], data["type"])
+        if category_id is None:
+            raise ApiError(409, "Não foi possível cadastrar a categoria")
+        return 201, {"id": category_id}
+
+    def handle_get_transactions(self):
+        # O token de continuação é enviado ao cliente como "dia:id"
+        after = self._param("after")
+        if after is not None:
+            try:
+                day, _, transaction_id = after.partition(":")
+                after = (int(day), int(transaction_id))
+            except ValueError:
+                raise ApiError(400, "Parâmetro inválido: after")
+
+        page = self._finance().get_transactions_page(
+            after, self._limit(), *self._period(), self._param("category_id", int)
+        )
+        if page["next"] is not None:
+            page["next"] = "{}:{}".format(*page["next"])
+        return 200, page
+
+    def handle_search_transactions(self):
+        query = self._param("q")
+        if not query:
+            raise ApiError(400, "Informe o parâmetro q")
+        return 200, self._finance().search_transactions(
+            query, *self._period(), self._param("category_id", int),
+            self._limit()
+        )
+
+    def handle_add_transactions(self):
+        data = self._json()
+        single = "transactions" not in data
+        rows = [data] if single else data["transactions"]
+
+        fields = ("date", "amount", "description", "category_id")
+        for row in rows:
+            if not isinstance(row, dict):
+                raise ApiError(400, "Cada transação deve ser um objeto JSON")
+            missing = [field for field in fields if field not in row]
+            if missing:
+                raise ApiError(400, f"Campos ausentes: {', '.join(missing)}")
+            if not isinstance(row["date"], str):
+                raise ApiError(400, "date deve ser um texto no formato AAAA-MM-DD")
+            if isinstance(row["amount"], bool) or not isinstance(row["amount"], (str, int, Decimal)):
+                raise ApiError(400, "amount deve ser um número ou texto")
+            if row["description"] is not None and not isinstance(row["description"], str):
+                raise ApiError(400, "description deve ser um texto")
+            if isinstance(row["category_id"], bool) or not isinstance(row["category_id"], int):
+                raise ApiError(400, "category_id deve ser um número inteiro")
+
+        # Em uma única transação do banco: categoria inválida rejeita o lote inteiro
+        new_ids = self._finance().add_transactions([{field: row[field] for field in fields} for row in rows])
+        return 201, {"id": new_ids[0]} if single else {"ids": new_ids}
+
+    def handle_delete_transactions(self):
+        ids = self._json().get("ids")
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            raise ApiError(400, "Informe ids (lista de números)")
+        return 200, {"deleted": self._finance().delete_transactions(ids)}
+
+    def handle_get_balance(self):
+        return 200, {"balance": self._finance().get_balance(*self._period())}
+
+    def handle_get_monthly_summary(self):
+        return 200, self._finance().get_monthly_summary(self._param("year", int), self._param("month", int))
+
+    def handle_get_yearly_summary(self):
+        return 200, self._finance().get_yearly_summary(self._param("year", int))
+
+    def handle_export_to_csv(self):
+        finance = self._finance()
+        fd, path = tempfile.mkstemp(prefix="export_", suffix=".csv")
+        os.close(fd)
+        if not finance.export_to_csv(path, *self._period(), compress=False):
+            os.unlink(path)
+            raise ApiError(500, "Erro ao exportar para CSV")
+        return 200, Path(path)
+
+    def handle_import_from_csv(self):
+        finance = self._finance()
+        fd, path = tempfile.mkstemp(prefix="import_", suffix=".csv")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.body)
+            report = finance.import_from_csv(path, skip_duplicates=self._param("skip_duplicates", int, 1) != 0)
+        finally:
+            os.unlink(path)
+
+        if report is False:
+            raise ApiError(400, "Erro ao importar o CSV")
+        return 200, report
+
+    def handle_get_metrics(self):
+        return 200, self.server.get_metrics()
+
+    def handle_health(self):
+        return 200, {"status": "ok"}
+
+
+def _json_default(value):
+    # Valores monetários vão como texto para não perder precisão
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
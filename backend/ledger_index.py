@@ -0,0 +1,102 @@
+"""Índice de saldos em memória (árvore de Fenwick indexada pelo dia).
+
+Guarda o movimento líquido (receitas - despesas, em centavos) de cada dia e
+responde "saldo até a data" e "variação entre duas datas" em O(log n); um
+lançamento novo ou excluído atualiza o índice também em O(log n), sem
+recalcular o histórico.
+"""
+
+
+class FenwickTree:
+    """Árvore de Fenwick (Binary Indexed Tree) de somas de prefixo"""
+
+    def __init__(self, size):
+        self.size = size
+        self._tree = [0] * (size + 1)
+
+    @classmethod
+    def from_values(cls, values):
+        """Constrói a árvore a partir de uma lista de valores em O(n)"""
+        tree = cls(len(values))
+        data = tree._tree
+        for i, value in enumerate(values, start=1):
+            data[i] += value
+            parent = i + (i & -i)
+            if parent <= tree.size:
+                data[parent] += data[i]
+        return tree
+
+    def add(self, index, delta):
+        """Soma delta à posição index (0 a size - 1)"""
+        i = index + 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, index):
+        """Soma das posições 0 a index (inclusive); índices negativos somam 0"""
+        i = min(index + 1, self.size)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+
+class LedgerIndex:
+    """Saldo por dia de um usuário, para consultas de saldo acumulado"""
+
+    # Folga (em dias) reservada ao criar o índice, para lançamentos futuros
+    MARGIN = 366
+
+    def __init__(self, daily_net=()):
+        """daily_net: pares (dia, movimento líquido em centavos); dia = date.toordinal()"""
+        self._daily = {}
+        for day, cents in daily_net:
+            self._daily[day] = self._daily.get(day, 0) + cents
+        self._rebuild()
+
+    def _rebuild(self, first_day=None, last_day=None):
+        """Recria a árvore cobrindo os dias registrados (e o intervalo pedido)"""
+        days = list(self._daily)
+        if first_day is not None:
+            days += [first_day, last_day]
+        if not days:
+            self._origin = 0
+            self._tree = FenwickTree(0)
+            return
+
+        self._origin = min(days) - self.MARGIN
+        size = max(days) - self._origin + 1 + self.MARGIN
+
+        values = [0] * size
+        for day, cents in self._daily.items():
+            values[day - self._origin] = cents
+        self._tree = FenwickTree.from_values(values)
+
+    def add(self, day, cents):
+        """Registra um movimento (positivo ou negativo) no dia"""
+        if not cents:
+            return
+        index = day - self._origin
+        if index < 0 or index >= self._tree.size:
+            # Dia fora do intervalo coberto: recria com mais espaço (raro)
+            self._rebuild(day, day)
+            index = day - self._origin
+
+        self._daily[day] = self._daily.get(day, 0) + cents
+        self._tree.add(index, cents)
+
+    def balance_as_of(self, day):
+        """Saldo acumulado até o fim do dia (centavos)"""
+        return self._tree.prefix_sum(day - self._origin)
+
+    def net_change(self, start_day=None, end_day=None):
+        """Variação do saldo entre os dias (inclusive); sem limites, o saldo total"""
+        end = self.total() if end_day is None else self.balance_as_of(end_day)
+        start = 0 if start_day is None else self.balance_as_of(start_day - 1)
+        return end - start
+
+    def total(self):
+        """Saldo de todos os lançamentos registrados"""
+        return self._tree.prefix_sum(self._tree.size - 1)
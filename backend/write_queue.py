@@ -0,0 +1,135 @@
+"""Fila de gravações em segundo plano (write-behind).
+
+Os lançamentos enfileirados são gravados por uma thread dedicada ao banco;
+os que chegam juntos são agrupados em uma única transação (um único commit
+e fsync). Quem enfileira não espera a gravação: o resultado é informado
+pelos callbacks on_written/on_failed, chamados na thread da fila.
+"""
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class WriteQueue:
+    """Grava lotes de transações em uma thread dedicada"""
+
+    # Tempo (em segundos) que a fila espera por mais lançamentos antes de gravar
+    LINGER = 0.05
+
+    # Quantidade máxima de lançamentos por commit
+    MAX_BATCH = 500
+
+    _STOP = object()
+
+    def __init__(self, write_batch, on_written=None, on_failed=None):
+        """write_batch(linhas) grava as linhas em uma transação e retorna os novos ids
+        (ex.: FinanceManager.add_transactions). on_written([(linha, id)]) e
+        on_failed(linha, erro) recebem o resultado de cada lote.
+        """
+        self.write_batch = write_batch
+        self.on_written = on_written
+        self.on_failed = on_failed
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._write_lock = threading.Lock()  # mantido durante a gravação de cada lote
+        self._thread = threading.Thread(target=self._run, name="db-write-queue", daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        """Enfileira uma linha (date, amount, description, category_id) ou dicionário"""
+        if self._closed:
+            raise RuntimeError("A fila de gravação foi encerrada")
+        self._queue.put(row)
+
+    def pending(self):
+        """Quantidade aproximada de lançamentos ainda não gravados"""
+        return self._queue.unfinished_tasks
+
+    def flush(self):
+        """Bloqueia até que tudo o que foi enfileirado tenha sido gravado"""
+        self._queue.join()
+
+    @contextmanager
+    def paused(self):
+        """Suspende as gravações durante o bloco (ex.: restauração de backup).
+
+        O lote em gravação termina antes do bloco começar; os lançamentos
+        enfileirados durante o bloco são gravados depois dele.
+        """
+        with self._write_lock:
+            yield
+
+    def close(self):
+        """Grava os lançamentos pendentes e encerra a thread da fila"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is self._STOP:
+                self._queue.task_done()
+                break
+
+            batch = [item]
+            stop = self._collect(batch)
+            try:
+                with self._write_lock:
+                    written, failed = self._write(batch)
+            finally:
+                # O lote deixa de contar em pending() antes dos avisos, para que
+                # os callbacks saibam se ainda há lançamentos a caminho
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+
+            try:
+                for row, error in failed:
+                    if self.on_failed:
+                        self.on_failed(row, error)
+                if written and self.on_written:
+                    self.on_written(written)
+            except Exception as e:
+                # Erro nos callbacks não pode derrubar a thread da fila
+                print(f"Erro na fila de gravação: {e}")
+
+    def _collect(self, batch):
+        """Junta ao lote o que chegar durante LINGER; retorna True se a fila foi encerrada"""
+        deadline = time.monotonic() + self.LINGER
+        while len(batch) < self.MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if item is self._STOP:
+                return True
+            batch.append(item)
+        return False
+
+    def _write(self, batch):
+        """Grava o lote em um commit; se falhar, isola as linhas com erro.
+
+        Retorna ([(linha, id)] gravadas, [(linha, erro)] rejeitadas).
+        """
+        try:
+            return list(zip(batch, self.write_batch(batch))), []
+        except Exception:
+            pass
+
+        # Uma linha inválida desfaz o lote inteiro: grava uma a uma para
+        # que apenas as linhas com erro sejam rejeitadas
+        written, failed = [], []
+        for row in batch:
+            try:
+                written.extend(zip([row], self.write_batch([row])))
+            except Exception as e:
+                print(f"Erro ao gravar lançamento: {e}")
+                failed.append((row, e))
+        return written, failed
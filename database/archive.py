@@ -0,0 +1,62 @@
+"""Arquivamento de anos encerrados.
+
+Uso (a partir da raiz do projeto):
+
+    python -m database.archive 2019 2020     # arquiva os anos informados
+    python -m database.archive --before 2022 # arquiva todos os anos anteriores a 2022
+    python -m database.archive --list        # lista os anos já arquivados
+"""
+
+import argparse
+import sys
+from database.db_manager import DatabaseManager
+from database.bootstrap import configure_database
+from ults.settings_manager import SettingsManager
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move anos encerrados para bancos de arquivo morto")
+    parser.add_argument("years", nargs="*", type=int, help="anos a arquivar")
+    parser.add_argument("--before", type=int, help="arquiva todos os anos com transações anteriores a este")
+    parser.add_argument("--list", action="store_true", help="lista os anos arquivados")
+    parser.add_argument("--no-vacuum", action="store_true", help="não compacta o banco principal")
+    args = parser.parse_args(argv)
+
+    configure_database(SettingsManager())
+    db_manager = DatabaseManager()
+    db_manager.setup_database()
+
+    # No modo particionado, cada usuário tem o próprio banco e os próprios arquivos mortos
+    databases = db_manager.shards() if db_manager.sharded else [db_manager]
+
+    years = set(args.years)
+    if args.before:
+        for database in databases:
+            with database.connection() as conn:
+                rows = conn.execute(
+                    "SELECT DISTINCT substr(date, 1, 4) FROM transactions WHERE date < ?",
+                    (f"{args.before:04d}-01-01",)
+                )
+                years.update(int(row[0]) for row in rows)
+
+    ok = True
+    years = sorted(years)
+    for year in years:
+        # Compacta o banco principal uma única vez, depois do último ano
+        moved = db_manager.archive_year(year, vacuum=not args.no_vacuum and year == years[-1])
+        if moved is False:
+            ok = False
+        else:
+            print(f"{year}: {moved} transação(ões) arquivada(s)")
+
+    if args.list or not years:
+        for database in databases:
+            for archive in database.get_archives():
+                print(f"{archive['year']}: {archive['rows']} transação(ões) em {archive['file_name']} "
+                      f"(arquivado em {archive['archived_at']})")
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+from pathlib import Path
+from database.connection_pool import configure_pools
+from database.instrumentation import enable_instrumentation
+from database.sharding import configure_sharding
+
+
+def configure_database(settings):
+    """Aplica as configurações de banco (SettingsManager) antes do primeiro acesso.
+    
+    Chamado pelos pontos de entrada (main.py, server.py, database.archive).
+    """
+    if settings.get_setting("db_instrumentation"):
+        Path("data").mkdir(exist_ok=True)
+        enable_instrumentation(settings.get_setting("slow_query_ms"), log_file=Path("data") / "slow_queries.log")
+    
+    # Perfil de desempenho do SQLite e particionamento por usuário
+    configure_pools(settings.get_setting("db_profile"), settings.get_setting("db_pragmas"))
+    configure_sharding(settings.get_setting("db_sharding"))
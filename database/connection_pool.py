@@ -0,0 +1,318 @@
+import sqlite3
+import threading
+import time
+import atexit
+from contextlib import contextmanager
+from pathlib import Path
+from database.instrumentation import connection_factory
+
+
+# Perfis de desempenho: PRAGMAs aplicados a cada conexão aberta pelo pool
+PERFORMANCE_PROFILES = {
+    # Máxima durabilidade: cada commit é sincronizado em disco
+    "safe": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -8000,       # KiB (valor negativo = tamanho em KiB)
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+    },
+    # Padrão: WAL + synchronous=NORMAL não corrompe o banco em quedas de energia,
+    # no máximo perde os últimos commits
+    "balanced": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,      # 64 MiB
+        "mmap_size": 268435456,    # 256 MiB
+        "temp_store": "MEMORY",
+    },
+    # Bases grandes em máquinas com bastante memória
+    "fast": {
+        "busy_timeout": 10000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -262144,     # 256 MiB
+        "mmap_size": 1073741824,   # 1 GiB
+        "temp_store": "MEMORY",
+    },
+}
+
+DEFAULT_PROFILE = "balanced"
+
+
+class ConnectionPool:
+    """Pool de conexões SQLite de longa duração, uma conexão por thread"""
+
+    # Intervalo (em segundos) sem uso após o qual a conexão é verificada
+    HEALTH_CHECK_INTERVAL = 30
+
+    # Intervalo (em segundos) entre execuções de PRAGMA optimize por conexão
+    OPTIMIZE_INTERVAL = 3600
+
+    def __init__(self, db_path, pragmas=None):
+        self.db_path = Path(db_path)
+        self.pragmas = dict(pragmas if pragmas is not None else PERFORMANCE_PROFILES[DEFAULT_PROFILE])
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}  # thread id -> conexão
+        self._busy = set()  # threads com a conexão emprestada (dentro de connection())
+        self._generation = 0  # incrementado por close_all(); conexões anteriores são descartadas
+        self._closed = False
+
+    def _create_connection(self):
+        """Abre uma nova conexão física com o banco de dados"""
+        # A conexão só é usada pela thread dona; check_same_thread=False
+        # permite apenas que close_all() a feche a partir de outra thread
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, factory=connection_factory())
+        conn.row_factory = sqlite3.Row  # Para acessar colunas pelo nome
+        
+        # Nomes e valores vêm dos perfis (filtrados em configure_pools)
+        for name, value in self.pragmas.items():
+            if name == "journal_mode":
+                self._set_journal_mode(conn, value)
+            else:
+                conn.execute(f"PRAGMA {name} = {value}")
+        
+        return conn
+    
+    def _set_journal_mode(self, conn, mode):
+        """Aplica o modo do diário, aguardando se outra conexão estiver convertendo o banco.
+        
+        A conversão de um banco antigo para WAL exige acesso exclusivo, e o
+        SQLite não aplica busy_timeout a ela: conexões abertas ao mesmo tempo
+        (ex.: interface e servidor) falhariam com "database is locked".
+        """
+        deadline = time.monotonic() + int(self.pragmas.get("busy_timeout", 5000)) / 1000
+        while True:
+            try:
+                conn.execute(f"PRAGMA journal_mode = {mode}")
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.01)
+
+    def configure(self, pragmas):
+        """Troca os PRAGMAs do pool; as conexões são reabertas com os novos valores"""
+        self.pragmas = dict(pragmas)
+        self.close_all()
+
+    def _is_healthy(self, conn):
+        """Verifica se a conexão ainda responde"""
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        """Obtém a conexão da thread atual, criando-a se necessário"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("O pool de conexões foi encerrado")
+
+        conn = getattr(self._local, "connection", None)
+        last_used = getattr(self._local, "last_used", 0)
+
+        if conn is not None and getattr(self._local, "generation", None) != self._generation:
+            # close_all() já fechou (ou fechará) esta conexão
+            conn = None
+
+        if conn is not None and time.monotonic() - last_used > self.HEALTH_CHECK_INTERVAL:
+            if not self._is_healthy(conn):
+                self._discard(conn)
+                conn = None
+
+        if conn is None:
+            conn = self._create_connection()
+            self._local.connection = conn
+            self._local.last_optimize = time.monotonic()
+            with self._lock:
+                dead = self._prune_dead_threads()
+                self._connections[threading.get_ident()] = conn
+                self._local.generation = self._generation
+            for old in dead:
+                self._close_quietly(old)
+
+        self._local.last_used = time.monotonic()
+        return conn
+
+    def release(self, conn):
+        """Devolve a conexão ao pool descartando transações pendentes"""
+        if conn.in_transaction:
+            conn.rollback()
+        
+        now = time.monotonic()
+        self._local.last_used = now
+        
+        # Mantém as estatísticas do planejador atualizadas em conexões longas
+        if now - getattr(self._local, "last_optimize", now) > self.OPTIMIZE_INTERVAL:
+            self._optimize(conn)
+            self._local.last_optimize = now
+
+    @staticmethod
+    def _optimize(conn):
+        """Executa PRAGMA optimize (recomendado periodicamente e antes de fechar)"""
+        try:
+            conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Empresta a conexão da thread atual durante o bloco 'with'.
+        
+        Blocos aninhados na mesma thread recebem a mesma conexão; ela só é
+        devolvida ao pool (desfazendo transações não confirmadas) quando o
+        último bloco aberto termina. Os blocos podem terminar fora de ordem
+        (ex.: um gerador suspenso finalizado dentro de outro bloco).
+        """
+        holders = getattr(self._local, "holders", None)
+        if holders is None:
+            holders = self._local.holders = []
+        if holders:
+            conn = self._local.connection
+        else:
+            conn = self._borrow()
+        
+        # Cada bloco registra a sua própria marca, retirada ao sair
+        token = object()
+        holders.append(token)
+        try:
+            yield conn
+        finally:
+            holders.remove(token)
+            if not holders:
+                self._give_back(conn)
+
+    def _borrow(self):
+        """Obtém a conexão da thread e a marca como em uso (protegida de close_all)"""
+        ident = threading.get_ident()
+        while True:
+            conn = self.acquire()
+            with self._lock:
+                if self._local.generation == self._generation:
+                    self._busy.add(ident)
+                    return conn
+            # close_all() rodou entre acquire() e a marcação: abre outra conexão
+            self._local.connection = None
+
+    def _give_back(self, conn):
+        """Devolve a conexão; se close_all() rodou durante o uso, fecha-a agora"""
+        try:
+            self.release(conn)
+        finally:
+            with self._lock:
+                self._busy.discard(threading.get_ident())
+                retired = self._local.generation != self._generation
+            if retired:
+                self._local.connection = None
+                self._close_quietly(conn)
+
+    def _prune_dead_threads(self):
+        """Retira do pool as conexões de threads encerradas (ex.: executores); chamar com _lock"""
+        alive = {thread.ident for thread in threading.enumerate()}
+        dead = [ident for ident in self._connections if ident not in alive]
+        return [self._connections.pop(ident) for ident in dead]
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _discard(self, conn):
+        """Remove uma conexão defeituosa do pool"""
+        with self._lock:
+            for ident, pooled in list(self._connections.items()):
+                if pooled is conn:
+                    del self._connections[ident]
+        self._local.connection = None
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        """Fecha todas as conexões do pool (ex.: antes de restaurar um backup).
+        
+        Conexões em uso por outras threads não são interrompidas: a thread
+        dona termina o bloco atual e a fecha ao devolvê-la. Todas as threads
+        recebem uma conexão nova no próximo acquire().
+        """
+        with self._lock:
+            self._generation += 1
+            connections = [
+                conn for ident, conn in self._connections.items() if ident not in self._busy
+            ]
+            self._connections.clear()
+
+        for conn in connections:
+            self._optimize(conn)
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def shutdown(self):
+        """Encerra o pool definitivamente"""
+        self.close_all()
+        self._closed = True
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_profile_pragmas = dict(PERFORMANCE_PROFILES[DEFAULT_PROFILE])
+
+
+def get_pool(db_path):
+    """Retorna o pool compartilhado para o arquivo de banco de dados"""
+    key = str(Path(db_path).resolve())
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_path, _profile_pragmas)
+            _pools[key] = pool
+        return pool
+
+
+def configure_pools(profile=DEFAULT_PROFILE, overrides=None):
+    """Define o perfil de desempenho (nome em PERFORMANCE_PROFILES) de todos os pools.
+    
+    overrides permite ajustar PRAGMAs individuais do perfil escolhido.
+    """
+    global _profile_pragmas
+    
+    if profile not in PERFORMANCE_PROFILES:
+        print(f"Perfil de banco de dados desconhecido: {profile}; usando '{DEFAULT_PROFILE}'")
+        profile = DEFAULT_PROFILE
+    
+    pragmas = dict(PERFORMANCE_PROFILES[profile])
+    for name, value in (overrides or {}).items():
+        # Só aceita ajustes dos PRAGMAs conhecidos, com valores simples
+        if name in pragmas and str(value).lstrip("-").isalnum():
+            pragmas[name] = value
+        else:
+            print(f"Ajuste de PRAGMA ignorado: {name} = {value!r}")
+    
+    with _pools_lock:
+        _profile_pragmas = pragmas
+        pools = list(_pools.values())
+    
+    for pool in pools:
+        pool.configure(pragmas)
+
+
+def shutdown_pools():
+    """Fecha todos os pools abertos (chamado automaticamente na saída)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.shutdown()
+
+
+atexit.register(shutdown_pools)
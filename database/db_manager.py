@@ -2,153 +2,240 @@ import sqlite3
 import os
 import datetime
 import hashlib
+import heapq
 import json
+import threading
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
+from database.connection_pool import get_pool
+from database.instrumentation import instrument_methods
+from database.sharding import routed_by_user, tenant_db_name, TENANTS_DIR, is_enabled as sharding_enabled
+from ults.helpers import to_cents, from_cents, date_to_day, day_to_date, transaction_fingerprint
+from database.migrations import (apply_migrations, check_query_plans, rebuild_summaries,
+                                 get_schema_version, has_description_index, SCHEMA_VERSION,
+                                 create_archive_tables, add_archived_summaries)
 
+# Com a instrumentação ativa, cada método público tem o tempo medido
+@instrument_methods(exclude=("connection", "close"))
 class DatabaseManager:
-    def __init__(self, db_name="finance_manager.db"):
+    # Quantidade máxima de linhas rejeitadas detalhadas no relatório de importação
+    MAX_REJECTED_LINES = 100
+    
+    def __init__(self, db_name="finance_manager.db", sharded=None):
         # Cria o diretório de dados se não existir
         data_dir = Path("data")
         data_dir.mkdir(exist_ok=True)
         
+        self.db_name = db_name
         self.db_path = data_dir / db_name
-        self.connection = None
-        self.cursor = None
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Modo particionado: os dados de cada usuário ficam em um banco próprio
+        # e este banco guarda apenas usuários e categorias padrão (ver database.sharding)
+        self.sharded = sharding_enabled() if sharded is None else sharded
+        self.tenants_dir = data_dir / TENANTS_DIR
+        self._shards = {}  # user_id -> DatabaseManager do banco do usuário
+        self._shard_locks = {}  # user_id -> bloqueio da criação do banco do usuário
+        
+        # Bancos com os anos arquivados (ver archive_year)
+        self.archive_dir = data_dir / "archive"
+        
+        # Pool compartilhado por todas as instâncias que usam o mesmo arquivo
+        self.pool = get_pool(self.db_path)
+        
+        # Cache dos ids de categoria válidos por usuário (usado nas inserções em lote)
+        self._category_ids = {}
+        self._cache_lock = threading.Lock()
+        
+        # Indica se o banco tem o índice FTS5 das descrições (verificado sob demanda)
+        self._has_fts = None
     
-    def connect(self):
-        """Estabelece conexão com o banco de dados"""
-        self.connection = sqlite3.connect(self.db_path)
-        self.connection.row_factory = sqlite3.Row  # Para acessar colunas pelo nome
-        self.cursor = self.connection.cursor()
-        return self.connection
+    def connection(self):
+        """Empresta a conexão da thread atual (uso: with self.connection() as conn)"""
+        return self.pool.connection()
+    
+    @contextmanager
+    def transaction(self):
+        """Escopo de escrita explícito (uso: with self.transaction() as conn).
+        
+        Abre com BEGIN IMMEDIATE, obtendo o bloqueio de escrita antes das
+        leituras do bloco; confirma ao sair ou desfaz em caso de exceção.
+        Blocos aninhados na mesma thread fazem parte da transação externa.
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
     
     def close(self):
-        """Fecha a conexão com o banco de dados"""
-        if self.connection:
-            self.connection.close()
-            self.connection = None
-            self.cursor = None
+        """Fecha as conexões abertas com o banco de dados"""
+        self.pool.close_all()
+        with self._cache_lock:
+            shards = list(self._shards.values())
+        for shard in shards:
+            shard.close()
+    
+    def shard(self, user_id):
+        """DatabaseManager do banco do usuário (criado e configurado no primeiro uso)"""
+        with self._cache_lock:
+            shard = self._shards.get(user_id)
+            if shard is not None:
+                return shard
+            creating = self._shard_locks.setdefault(user_id, threading.Lock())
+        
+        # Uma thread por usuário cria e migra o banco; as demais aguardam por ela
+        with creating:
+            with self._cache_lock:
+                shard = self._shards.get(user_id)
+            if shard is None:
+                shard = DatabaseManager(tenant_db_name(self.db_name, user_id), sharded=False)
+                shard.setup_database()
+                with self._cache_lock:
+                    self._shards[user_id] = shard
+                    self._shard_locks.pop(user_id, None)
+        return shard
+    
+    def shards(self):
+        """DatabaseManager de cada banco de usuário existente"""
+        prefix = f"{self.db_path.stem}_user_"
+        user_ids = sorted(
+            int(path.stem[len(prefix):]) for path in self.tenants_dir.glob(f"{prefix}*.db")
+            if path.stem[len(prefix):].isdigit()
+        )
+        return [self.shard(user_id) for user_id in user_ids]
+    
+    # Categorias disponíveis para todos os usuários
+    DEFAULT_CATEGORIES = [
+        ("Salário", "income"),
+        ("Renda Extra", "income"),
+        ("Aluguel", "expense"),
+        ("Alimentação", "expense"),
+        ("Água", "expense"),
+        ("Faculdade", "expense"),
+        ("Seguro", "expense"),
+        ("Gasolina", "expense"),
+        ("Manutenção do carro", "expense"),
+        ("Imposto", "expense")
+    ]
     
     def setup_database(self):
         """Configura o banco de dados com as tabelas necessárias"""
-        conn = self.connect()
-        
-        # Tabela de usuários
-        conn.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            full_name TEXT NOT NULL,
-            email TEXT UNIQUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            settings TEXT
-        )
-        ''')
-        
-        # Tabela de categorias
-        conn.execute('''
-        CREATE TABLE IF NOT EXISTS categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            type TEXT NOT NULL,  -- 'income' ou 'expense'
-            user_id INTEGER,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        ''')
-        
-        # Tabela de transações
-        conn.execute('''
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            amount REAL NOT NULL,
-            description TEXT,
-            category_id INTEGER,
-            user_id INTEGER,
-            FOREIGN KEY (category_id) REFERENCES categories (id),
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        ''')
-        
-        # Inserir categorias padrão se não existirem
-        self.insert_default_categories()
-        
-        conn.commit()
-        self.close()
+        with self.connection() as conn:
+            # Esquema já atualizado: a inicialização não precisa fazer mais nada
+            if get_schema_version(conn) == SCHEMA_VERSION:
+                return
+            
+            # Tabela de usuários
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password TEXT NOT NULL,
+                full_name TEXT NOT NULL,
+                email TEXT UNIQUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                settings TEXT
+            )
+            ''')
+            
+            # Tabela de categorias
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS categories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                type TEXT NOT NULL,  -- 'income' ou 'expense'
+                user_id INTEGER,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+            ''')
+            
+            # Tabela de transações
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT NOT NULL,
+                amount REAL NOT NULL,
+                description TEXT,
+                category_id INTEGER,
+                user_id INTEGER,
+                FOREIGN KEY (category_id) REFERENCES categories (id),
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+            ''')
+            
+            conn.commit()
+            
+            # Aplica as migrações pendentes (índices etc.) em bancos existentes
+            apply_migrations(conn)
+            
+            # Inserir categorias padrão se não existirem
+            self.insert_default_categories(conn)
     
-    def insert_default_categories(self):
+    def insert_default_categories(self, conn=None):
         """Insere categorias padrão no banco de dados"""
-        default_categories = [
-            ("Salário", "income"),
-            ("Renda Extra", "income"),
-            ("Aluguel", "expense"),
-            ("Alimentação", "expense"),
-            ("Água", "expense"),
-            ("Faculdade", "expense"),
-            ("Seguro", "expense"),
-            ("Gasolina", "expense"),
-            ("Manutenção do carro", "expense"),
-            ("Imposto", "expense")
-        ]
-        
-        conn = self.connect()
-        for name, type_ in default_categories:
-            # Verifica se a categoria já existe
-            self.cursor.execute("SELECT id FROM categories WHERE name = ? AND type = ?", (name, type_))
-            if not self.cursor.fetchone():
-                self.cursor.execute(
-                    "INSERT INTO categories (name, type, user_id) VALUES (?, ?, NULL)",
-                    (name, type_)
-                )
+        if conn is None:
+            with self.connection() as conn:
+                return self.insert_default_categories(conn)
         
+        # Uma única instrução; o índice único (name, type, user_id) descarta
+        # as categorias que já existem
+        placeholders = ", ".join("(?, ?, NULL)" for _ in self.DEFAULT_CATEGORIES)
+        params = [value for category in self.DEFAULT_CATEGORIES for value in category]
+        conn.execute(
+            f"INSERT OR IGNORE INTO categories (name, type, user_id) VALUES {placeholders}",
+            params
+        )
         conn.commit()
-        self.close()
+    
+    def check_query_plans(self):
+        """Confere se as consultas principais estão usando os índices"""
+        with self.connection() as conn:
+            return check_query_plans(conn)
     
     def register_user(self, username, password, full_name, email=None):
         """Registra um novo usuário no sistema"""
+        # Hash da senha para armazenamento seguro
+        hashed_password = hashlib.sha256(password.encode()).hexdigest()
+        
+        # Configurações padrão do usuário
+        default_settings = {
+            "theme": "light",
+            "font_family": "Arial",
+            "font_size": 10,
+            "color_scheme": "default"
+        }
+        
         try:
-            conn = self.connect()
-            
-            # Hash da senha para armazenamento seguro
-            hashed_password = hashlib.sha256(password.encode()).hexdigest()
-            
-            # Configurações padrão do usuário
-            default_settings = {
-                "theme": "light",
-                "font_family": "Arial",
-                "font_size": 10,
-                "color_scheme": "default"
-            }
-            
-            self.cursor.execute(
-                "INSERT INTO users (username, password, full_name, email, settings) VALUES (?, ?, ?, ?, ?)",
-                (username, hashed_password, full_name, email, json.dumps(default_settings))
-            )
+            with self.transaction() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO users (username, password, full_name, email, settings) VALUES (?, ?, ?, ?, ?)",
+                    (username, hashed_password, full_name, email, json.dumps(default_settings))
+                )
             
-            user_id = self.cursor.lastrowid
-            conn.commit()
-            self.close()
-            return user_id
+            return cursor.lastrowid
         except sqlite3.IntegrityError:
             # Usuário já existe
-            self.close()
             return None
     
     def authenticate_user(self, username, password):
         """Autentica um usuário"""
-        conn = self.connect()
-        
         # Hash da senha para comparação
         hashed_password = hashlib.sha256(password.encode()).hexdigest()
         
-        self.cursor.execute(
-            "SELECT id, username, full_name, settings FROM users WHERE username = ? AND password = ?",
-            (username, hashed_password)
-        )
-        
-        user = self.cursor.fetchone()
-        self.close()
+        with self.connection() as conn:
+            user = conn.execute(
+                "SELECT id, username, full_name, settings FROM users WHERE username = ? AND password = ?",
+                (username, hashed_password)
+            ).fetchone()
         
         if user:
             return {
@@ -161,12 +248,8 @@ class DatabaseManager:
     
     def get_user_settings(self, user_id):
         """Obtém as configurações do usuário"""
-        conn = self.connect()
-        
-        self.cursor.execute("SELECT settings FROM users WHERE id = ?", (user_id,))
-        result = self.cursor.fetchone()
-        
-        self.close()
+        with self.connection() as conn:
+            result = conn.execute("SELECT settings FROM users WHERE id = ?", (user_id,)).fetchone()
         
         if result:
             return json.loads(result["settings"])
@@ -174,268 +257,1044 @@ class DatabaseManager:
     
     def update_user_settings(self, user_id, settings):
         """Atualiza as configurações do usuário"""
-        conn = self.connect()
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE users SET settings = ? WHERE id = ?",
+                (json.dumps(settings), user_id)
+            )
+    
+    @routed_by_user
+    def add_transaction(self, user_id, date, amount, description, category_id):
+        """Adiciona uma nova transação (amount em reais; gravado em centavos)"""
+        params = self._transaction_params(user_id, (date, amount, description, category_id))
         
-        self.cursor.execute(
-            "UPDATE users SET settings = ? WHERE id = ?",
-            (json.dumps(settings), user_id)
-        )
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO transactions (date, day, amount, description, category_id, user_id, fingerprint) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                params
+            )
         
-        conn.commit()
-        self.close()
+        return cursor.lastrowid
     
-    def add_transaction(self, user_id, date, amount, description, category_id):
-        """Adiciona uma nova transação"""
-        conn = self.connect()
+    @routed_by_user
+    def add_transactions(self, user_id, rows, chunk_size=500):
+        """Adiciona várias transações em uma única transação do banco.
+        
+        rows pode conter tuplas (date, amount, description, category_id) ou
+        dicionários com essas chaves, com amount em reais. As linhas são inseridas com executemany
+        em blocos de chunk_size e a lista com os novos ids é retornada.
+        Se alguma categoria for inválida nada é gravado (ValueError).
+        """
+        rows = iter(rows)
+        new_ids = []
         
-        self.cursor.execute(
-            "INSERT INTO transactions (date, amount, description, category_id, user_id) VALUES (?, ?, ?, ?, ?)",
-            (date, amount, description, category_id, user_id)
+        # Qualquer erro desfaz o lote inteiro
+        with self.transaction() as conn:
+            valid_ids = self._get_category_ids(conn, user_id)
+            
+            while True:
+                chunk = [self._transaction_params(user_id, row) for row in islice(rows, chunk_size)]
+                if not chunk:
+                    break
+                
+                for params in chunk:
+                    if params[4] not in valid_ids:
+                        # A categoria pode ter sido criada por outra instância
+                        # depois que o cache foi carregado: confere no banco
+                        valid_ids = self._get_category_ids(conn, user_id, refresh=True)
+                        if params[4] not in valid_ids:
+                            raise ValueError(f"Categoria inválida: {params[4]}")
+                
+                new_ids.extend(self._insert_transactions(conn, chunk))
+        
+        return new_ids
+    
+    @routed_by_user
+    def delete_transactions(self, user_id, transaction_ids):
+        """Exclui transações do usuário.
+        
+        Retorna as transações removidas ({"id", "day", "amount_cents",
+        "category_type"}), usadas para atualizar índices em memória.
+        """
+        transaction_ids = list(transaction_ids)
+        deleted = []
+        
+        try:
+            with self.transaction() as conn:
+                for start in range(0, len(transaction_ids), 500):
+                    batch = transaction_ids[start:start + 500]
+                    placeholders = ", ".join("?" * len(batch))
+                    
+                    deleted.extend(dict(row) for row in conn.execute(
+                        f"SELECT t.id, t.day, t.amount as amount_cents, c.type as category_type "
+                        f"FROM transactions t JOIN categories c ON t.category_id = c.id "
+                        f"WHERE t.user_id = ? AND t.id IN ({placeholders})",
+                        (user_id, *batch)
+                    ))
+                    conn.execute(
+                        f"DELETE FROM transactions WHERE user_id = ? AND id IN ({placeholders})",
+                        (user_id, *batch)
+                    )
+        except sqlite3.Error as e:
+            print(f"Erro ao excluir transações: {e}")
+            return False
+        
+        return deleted
+    
+    @staticmethod
+    def _insert_transactions(conn, chunk):
+        """Insere um bloco de linhas já validadas; retorna o intervalo de ids"""
+        conn.executemany(
+            "INSERT INTO transactions (date, day, amount, description, category_id, user_id, fingerprint) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            chunk
         )
         
-        transaction_id = self.cursor.lastrowid
-        conn.commit()
-        self.close()
+        # Com AUTOINCREMENT e a escrita bloqueada pela transação,
+        # os ids de um mesmo executemany são consecutivos
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return range(last_id - len(chunk) + 1, last_id + 1)
+    
+    @staticmethod
+    def _transaction_params(user_id, row):
+        """Converte uma linha (tupla ou dicionário) nos parâmetros do INSERT"""
+        if isinstance(row, dict):
+            date, amount, description, category_id = (
+                row["date"], row["amount"], row.get("description"), row["category_id"]
+            )
+        else:
+            date, amount, description, category_id = row
+        
+        day = date_to_day(date)
+        amount = to_cents(amount)
+        fingerprint = transaction_fingerprint(day, amount, description, category_id, user_id)
+        return (date, day, amount, description, category_id, user_id, fingerprint)
+    
+    def _get_category_ids(self, conn, user_id, refresh=False):
+        """Retorna os ids de categoria que o usuário pode usar (com cache).
         
-        return transaction_id
+        Com refresh=True o cache do usuário é recarregado do banco.
+        """
+        with self._cache_lock:
+            ids = None if refresh else self._category_ids.get(user_id)
+        
+        if ids is None:
+            rows = conn.execute(
+                "SELECT id FROM categories WHERE user_id IS NULL OR user_id = ?",
+                (user_id,)
+            )
+            ids = frozenset(row["id"] for row in rows)
+            with self._cache_lock:
+                self._category_ids[user_id] = ids
+        return ids
+    
+    def _invalidate_category_ids(self, user_id=None):
+        """Descarta o cache de ids de categoria (de um usuário ou de todos)"""
+        with self._cache_lock:
+            if user_id is None:
+                self._category_ids.clear()
+            else:
+                self._category_ids.pop(user_id, None)
     
+    @routed_by_user
     def get_transactions(self, user_id, start_date=None, end_date=None, category_id=None):
         """Obtém transações do usuário com filtros opcionais"""
-        conn = self.connect()
+        with self.connection() as conn:
+            schemas = self._attach_archives(conn, start_date, end_date)
+            if len(schemas) == 1:
+                query, params = self._transactions_query(user_id, start_date, end_date, category_id)
+                rows = conn.execute(query, params).fetchall()
+            else:
+                rows = list(self._merge_transactions(conn, schemas, user_id, start_date, end_date, category_id))
+            
+            transactions = [self._transaction_row(row) for row in rows]
         
-        query = """
-        SELECT t.id, t.date, t.amount, t.description, c.name as category_name, c.type as category_type
-        FROM transactions t
-        JOIN categories c ON t.category_id = c.id
-        WHERE t.user_id = ?
+        return transactions
+    
+    @routed_by_user
+    def iter_transactions(self, user_id, start_date=None, end_date=None, category_id=None, batch_size=1000):
+        """Percorre as transações sem carregar o resultado inteiro na memória"""
+        with self.connection() as conn:
+            schemas = self._attach_archives(conn, start_date, end_date)
+            if len(schemas) > 1:
+                for row in self._merge_transactions(conn, schemas, user_id, start_date, end_date, category_id):
+                    yield self._transaction_row(row)
+                return
+            
+            query, params = self._transactions_query(user_id, start_date, end_date, category_id)
+            cursor = conn.execute(query, params)
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield self._transaction_row(row)
+            finally:
+                cursor.close()
+    
+    @routed_by_user
+    def get_transactions_page(self, user_id, after=None, limit=100, start_date=None, end_date=None, category_id=None):
+        """Obtém uma página de transações usando paginação por chave (keyset).
+        
+        after é o token de continuação (day, id) devolvido pela página
+        anterior. Retorna {"transactions": [...], "next": token ou None}; o
+        custo de cada página não depende da posição no histórico.
         """
+        if limit < 1:
+            raise ValueError(f"Tamanho de página inválido: {limit}")
+        
+        with self.connection() as conn:
+            schemas = self._attach_archives(conn, start_date, end_date, after)
+            
+            # Busca uma linha extra para saber se existe próxima página
+            rows = islice(
+                self._merge_transactions(conn, schemas, user_id, start_date, end_date, category_id,
+                                         after, limit + 1),
+                limit + 1
+            )
+            transactions = [self._transaction_row(row) for row in rows]
+        
+        next_token = None
+        if len(transactions) > limit:
+            transactions = transactions[:limit]
+            last = transactions[-1]
+            next_token = (last["day"], last["id"])
+        
+        return {"transactions": transactions, "next": next_token}
+    
+    @routed_by_user
+    def search_transactions(self, user_id, query, start_date=None, end_date=None, category_id=None, limit=100):
+        """Busca transações pela descrição, com os mesmos filtros de get_transactions.
+        
+        Usa o índice de texto completo (FTS5); cada palavra da busca é
+        tratada como prefixo e todas precisam aparecer na descrição.
+        """
+        with self.connection() as conn:
+            if self._has_fts is None:
+                self._has_fts = has_description_index(conn)
+            
+            sql, params = self._transactions_query(
+                user_id, start_date, end_date, category_id,
+                description=query, fts=self._has_fts
+            )
+            sql += " LIMIT ?"
+            params.append(limit)
+            
+            return [self._transaction_row(row) for row in conn.execute(sql, params).fetchall()]
+    
+    @staticmethod
+    def _fts_query(text):
+        """Converte o texto digitado em uma consulta FTS5 segura (prefixos com AND)"""
+        terms = []
+        for word in text.split():
+            # Aspas protegem operadores e caracteres especiais da sintaxe FTS5
+            terms.append('"' + word.replace('"', '""') + '"*')
+        return " ".join(terms)
+    
+    @staticmethod
+    def _transaction_row(row):
+        """Converte uma linha de transação em dicionário com amount em Decimal"""
+        transaction = dict(row)
+        transaction["amount"] = from_cents(transaction["amount_cents"])
+        return transaction
+    
+    def _merge_transactions(self, conn, schemas, user_id, start_date=None, end_date=None, category_id=None,
+                            after=None, limit=None):
+        """Consulta cada banco (principal e arquivos mortos) e intercala os resultados.
+        
+        Cada consulta já vem ordenada pelo próprio índice (user_id, day); a
+        intercalação mantém a ordem (day, id) decrescente sem ordenar de novo.
+        """
+        cursors = []
+        for schema in schemas:
+            query, params = self._transactions_query(user_id, start_date, end_date, category_id, after,
+                                                     schema=schema)
+            if limit is not None:
+                query += " LIMIT ?"
+                params.append(limit)
+            cursors.append(conn.execute(query, params))
+        
+        if len(cursors) == 1:
+            return cursors[0]
+        return heapq.merge(*cursors, key=lambda row: (row["day"], row["id"]), reverse=True)
+    
+    @classmethod
+    def _transactions_query(cls, user_id, start_date=None, end_date=None, category_id=None, after=None,
+                            description=None, fts=False, schema="main"):
+        """Monta a consulta de transações com os filtros informados"""
+        use_fts = fts and description and description.split()
+        
+        # As categorias ficam sempre no banco principal
+        query = f"""
+        SELECT t.id, t.date, t.day, t.amount as amount_cents, t.description,
+               c.name as category_name, c.type as category_type
+        FROM {schema}.transactions t
+        JOIN main.categories c ON t.category_id = c.id
+        """
+        
+        # Na busca textual o '+' impede o uso do índice (user_id, day): o
+        # planejador parte dos poucos ids encontrados pelo FTS5 em vez de
+        # percorrer todas as transações do usuário
+        query += " WHERE +t.user_id = ?" if use_fts else " WHERE t.user_id = ?"
         
         params = [user_id]
         
         if start_date:
-            query += " AND t.date >= ?"
-            params.append(start_date)
+            query += " AND t.day >= ?"
+            params.append(date_to_day(start_date))
         
         if end_date:
-            query += " AND t.date <= ?"
-            params.append(end_date)
+            query += " AND t.day <= ?"
+            params.append(date_to_day(end_date))
         
         if category_id:
             query += " AND t.category_id = ?"
             params.append(category_id)
         
-        query += " ORDER BY t.date DESC"
+        if description and description.split():
+            if use_fts:
+                query += " AND t.id IN (SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)"
+                params.append(cls._fts_query(description))
+            else:
+                # Sem FTS5 disponível: busca por substring
+                escaped = description.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                query += " AND t.description LIKE ? ESCAPE '\\'"
+                params.append(f"%{escaped}%")
         
-        self.cursor.execute(query, params)
-        transactions = [dict(row) for row in self.cursor.fetchall()]
+        if after:
+            # Continua a partir da última linha da página anterior; a
+            # condição em t.day permite a busca pelo índice (user_id, day)
+            after_day, after_id = after
+            query += " AND t.day <= ? AND (t.day < ? OR t.id < ?)"
+            params.extend([after_day, after_day, after_id])
         
-        self.close()
-        return transactions
+        query += " ORDER BY t.day DESC, t.id DESC"
+        
+        return query, params
+    
+    # Quantidade máxima de arquivos mortos anexados ao mesmo tempo em uma conexão
+    MAX_ATTACHED_ARCHIVES = 8
+    
+    def get_archives(self):
+        """Lista os anos arquivados: [{"year", "file_name", "rows", "archived_at"}]"""
+        with self.connection() as conn:
+            return [dict(row) for row in conn.execute("SELECT * FROM archives ORDER BY year")]
+    
+    def archive_year(self, year, vacuum=True):
+        """Move as transações de um ano encerrado para um banco de arquivo morto.
+        
+        As linhas vão para data/archive/<banco>_<ano>.db e saem do banco
+        principal; os resumos diário/mensal do ano continuam no banco
+        principal, de modo que saldos e relatórios não precisam do arquivo.
+        As consultas de transações anexam o arquivo quando o período pedido
+        o inclui. Pode ser repetido para o mesmo ano (lançamentos retroativos).
+        Retorna a quantidade de transações movidas, ou False em caso de erro.
+        No modo particionado, arquiva o ano no banco de cada usuário.
+        """
+        if year >= datetime.date.today().year:
+            print(f"Erro ao arquivar: o ano {year} ainda não foi encerrado")
+            return False
+        
+        if self.sharded:
+            results = [shard.archive_year(year, vacuum) for shard in self.shards()]
+            return False if any(moved is False for moved in results) else sum(results)
+        
+        first_day = date_to_day(datetime.date(year, 1, 1))
+        last_day = date_to_day(datetime.date(year, 12, 31))
+        file_name = f"{self.db_path.stem}_{year}.db"
+        schema = f"archive_{year}"
+        columns = "id, date, day, amount, description, category_id, user_id, fingerprint"
+        
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        
+        with self.connection() as conn:
+            try:
+                archived_before = conn.execute(
+                    "SELECT 1 FROM archives WHERE year = ?", (year,)
+                ).fetchone() is not None
+                
+                empty = False
+                
+                self._detach_archives(conn)
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(self.archive_dir / file_name),))
+                try:
+                    # O bloqueio de escrita vale da cópia até a remoção: uma transação
+                    # retroativa gravada entre as duas etapas seria apagada sem
+                    # ter sido copiada
+                    conn.execute("BEGIN IMMEDIATE")
+                    
+                    # 1ª etapa: copia para o arquivo morto. Os ids são preservados,
+                    # então repetir a cópia após uma falha não duplica linhas
+                    create_archive_tables(conn, schema)
+                    cursor = conn.execute(
+                        f"INSERT OR IGNORE INTO {schema}.transactions ({columns}) "
+                        f"SELECT {columns} FROM main.transactions WHERE day >= ? AND day <= ?",
+                        (first_day, last_day)
+                    )
+                    moved = cursor.rowcount
+                    
+                    # Ano sem transações e ainda não arquivado: não registra o
+                    # arquivo (vazio), que seria anexado nas consultas do período
+                    rows = conn.execute(f"SELECT COUNT(*) FROM {schema}.transactions").fetchone()[0]
+                    empty = not rows and not archived_before
+                    if empty:
+                        return 0
+                    
+                    # 2ª etapa: remove do banco principal. Os gatilhos descontam as
+                    # linhas dos resumos; o ano é então recalculado a partir do arquivo
+                    conn.execute(
+                        "DELETE FROM main.transactions WHERE day >= ? AND day <= ?",
+                        (first_day, last_day)
+                    )
+                    conn.execute(
+                        "DELETE FROM daily_summary WHERE day >= ? AND day <= ?",
+                        (first_day, last_day)
+                    )
+                    conn.execute(
+                        "DELETE FROM monthly_summary WHERE month >= ? AND month <= ?",
+                        (f"{year}-01", f"{year}-12")
+                    )
+                    add_archived_summaries(conn, schema)
+                    
+                    rows = conn.execute(f"SELECT COUNT(*) FROM {schema}.transactions").fetchone()[0]
+                    conn.execute(
+                        "INSERT INTO archives (year, file_name, rows) VALUES (?, ?, ?) "
+                        "ON CONFLICT (year) DO UPDATE SET rows = excluded.rows, archived_at = CURRENT_TIMESTAMP",
+                        (year, file_name, rows)
+                    )
+                    conn.commit()
+                finally:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    conn.execute(f"DETACH DATABASE {schema}")
+                    if empty:
+                        (self.archive_dir / file_name).unlink(missing_ok=True)
+                
+                # Devolve ao sistema o espaço das linhas removidas
+                if vacuum and moved:
+                    conn.execute("VACUUM")
+                
+                return moved
+            except Exception as e:
+                print(f"Erro ao arquivar o ano {year}: {e}")
+                return False
     
+    def _attach_archives(self, conn, start_date=None, end_date=None, after=None):
+        """Anexa à conexão os arquivos mortos que cobrem o período.
+        
+        Retorna os esquemas a consultar ("main" e os arquivos anexados), do
+        mais recente para o mais antigo.
+        """
+        query = "SELECT year, file_name FROM archives WHERE 1 = 1"
+        params = []
+        
+        if start_date:
+            query += " AND year >= ?"
+            params.append(day_to_date(date_to_day(start_date)).year)
+        
+        if end_date:
+            query += " AND year <= ?"
+            params.append(day_to_date(date_to_day(end_date)).year)
+        
+        if after:
+            # Na paginação, anos posteriores à última linha lida já foram percorridos
+            query += " AND year <= ?"
+            params.append(day_to_date(after[0]).year)
+        
+        archives = conn.execute(query + " ORDER BY year DESC", params).fetchall()
+        if not archives:
+            return ["main"]
+        
+        attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+        needed = {f"archive_{row['year']}" for row in archives}
+        
+        # O SQLite limita os bancos anexados (10 por padrão): libera os que não serão usados
+        if len(attached | needed) > self.MAX_ATTACHED_ARCHIVES + 2:
+            self._detach_archives(conn, keep=needed)
+            attached &= needed | {"main", "temp"}
+        
+        schemas = ["main"]
+        for row in archives:
+            schema = f"archive_{row['year']}"
+            if schema not in attached:
+                path = self.archive_dir / row["file_name"]
+                if not path.exists():
+                    # ATTACH criaria um banco vazio no lugar do arquivo ausente
+                    print(f"Erro: arquivo morto de {row['year']} não encontrado ({path})")
+                    continue
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+            schemas.append(schema)
+        
+        return schemas
+    
+    @staticmethod
+    def _detach_archives(conn, keep=()):
+        """Desanexa os arquivos mortos da conexão (exceto os de 'keep')"""
+        for row in conn.execute("PRAGMA database_list").fetchall():
+            if row[1].startswith("archive_") and row[1] not in keep:
+                conn.execute(f"DETACH DATABASE {row[1]}")
+    
+    @routed_by_user
     def get_categories(self, user_id=None, type_=None):
         """Obtém categorias com filtros opcionais"""
-        conn = self.connect()
-        
-        query = "SELECT id, name, type FROM categories WHERE user_id IS NULL"
+        query = "SELECT id, name, type FROM categories WHERE (user_id IS NULL"
         params = []
         
         if user_id:
             query += " OR user_id = ?"
             params.append(user_id)
         
+        query += ")"
+        
         if type_:
             query += " AND type = ?"
             params.append(type_)
         
-        self.cursor.execute(query, params)
-        categories = [dict(row) for row in self.cursor.fetchall()]
+        with self.connection() as conn:
+            categories = [dict(row) for row in conn.execute(query, params).fetchall()]
         
-        self.close()
         return categories
     
+    @routed_by_user
+    def add_category(self, user_id, name, type_):
+        """Adiciona uma categoria do usuário; retorna o id (existente ou novo)"""
+        try:
+            with self.transaction() as conn:
+                category_id = conn.execute(
+                    "INSERT INTO categories (name, type, user_id) VALUES (?, ?, ?)",
+                    (name, type_, user_id)
+                ).lastrowid
+        except sqlite3.IntegrityError:
+            # Categoria já cadastrada para o usuário
+            with self.connection() as conn:
+                category_id = conn.execute(
+                    "SELECT id FROM categories WHERE name = ? AND type = ? AND IFNULL(user_id, 0) = ?",
+                    (name, type_, user_id or 0)
+                ).fetchone()["id"]
+        
+        self._invalidate_category_ids(user_id)
+        return category_id
+    
+    @routed_by_user
     def get_balance(self, user_id, start_date=None, end_date=None):
-        """Calcula o saldo atual do usuário"""
-        conn = self.connect()
+        """Calcula o saldo do usuário (Decimal, em reais).
+        
+        Sem período é o saldo de todas as transações; com período, a variação
+        do saldo entre as datas. Cada saldo vem do ponto de controle do último
+        mês encerrado mais o movimento dos dias seguintes (no máximo um mês
+        pelo resumo diário), sem percorrer o histórico.
+        """
+        with self.connection() as conn:
+            # Uma única transação de leitura: pontos de controle e movimento
+            # recente vêm do mesmo instantâneo do banco
+            started = not conn.in_transaction
+            if started:
+                conn.execute("BEGIN")
+            try:
+                end = self._balance_as_of(conn, user_id, date_to_day(end_date) if end_date else None)
+                start = self._balance_as_of(conn, user_id, date_to_day(start_date) - 1) if start_date else 0
+            finally:
+                if started and conn.in_transaction:
+                    conn.commit()
+        
+        return from_cents(end - start)
+    
+    # Soma com sinal (receitas - despesas) das linhas de resumo 's'
+    _NET_TOTAL_SQL = "IFNULL(SUM(CASE WHEN c.type = 'income' THEN s.total ELSE -s.total END), 0)"
+    
+    def _balance_as_of(self, conn, user_id, day=None):
+        """Saldo em centavos até o fim do dia (None = todas as transações)"""
+        # Só meses encerrados têm ponto de controle: o mês corrente muda a cada lançamento
+        first_of_month = datetime.date.today().replace(day=1)
+        closed_month = (first_of_month - datetime.timedelta(days=1)).strftime("%Y-%m")
+        
+        if day is None:
+            checkpoint_month = closed_month
+            month_key = "9999-99"
+            first_day, last_day = 1, 0  # sem parcela diária
+        else:
+            date = day_to_date(day)
+            month_key = date.strftime("%Y-%m")
+            first_day = date_to_day(date.replace(day=1))
+            last_day = day
+            previous_month = day_to_date(first_day - 1).strftime("%Y-%m")
+            checkpoint_month = min(previous_month, closed_month)
+        
+        balance = self._get_checkpoint(conn, user_id, checkpoint_month)
+        
+        # Meses inteiros entre o ponto de controle e o mês da data + dias do mês da data
+        tail = conn.execute(f"""
+        SELECT
+            (SELECT {self._NET_TOTAL_SQL} FROM monthly_summary s
+             JOIN categories c ON s.category_id = c.id
+             WHERE s.user_id = ? AND s.month > ? AND s.month < ?)
+          + (SELECT {self._NET_TOTAL_SQL} FROM daily_summary s
+             JOIN categories c ON s.category_id = c.id
+             WHERE s.user_id = ? AND s.day >= ? AND s.day <= ?)
+        """, (user_id, checkpoint_month, month_key, user_id, first_day, last_day)).fetchone()[0]
+        
+        return balance + tail
+    
+    def _get_checkpoint(self, conn, user_id, month):
+        """Saldo em centavos até o fim do mês ('YYYY-MM'), pela tabela de pontos de controle.
         
+        Os pontos ausentes (ainda não calculados ou invalidados por um
+        lançamento retroativo) são recalculados a partir do último válido,
+        na transação de leitura atual, e gravados se possível (_save_checkpoints).
+        """
         query = """
-        SELECT 
-            SUM(CASE WHEN c.type = 'income' THEN t.amount ELSE 0 END) as total_income,
-            SUM(CASE WHEN c.type = 'expense' THEN t.amount ELSE 0 END) as total_expense
-        FROM transactions t
-        JOIN categories c ON t.category_id = c.id
-        WHERE t.user_id = ?
+        SELECT month, balance FROM balance_checkpoints
+        WHERE user_id = ? AND month <= ?
+        ORDER BY month DESC LIMIT 1
         """
+        row = conn.execute(query, (user_id, month)).fetchone()
+        if row is not None and row["month"] == month:
+            return row["balance"]
         
-        params = [user_id]
+        base_month, balance = (row["month"], row["balance"]) if row else ("", 0)
         
-        if start_date:
-            query += " AND t.date >= ?"
-            params.append(start_date)
+        rows = conn.execute(f"""
+        SELECT s.month, {self._NET_TOTAL_SQL} as net
+        FROM monthly_summary s
+        JOIN categories c ON s.category_id = c.id
+        WHERE s.user_id = ? AND s.month > ? AND s.month <= ?
+        GROUP BY s.month
+        ORDER BY s.month
+        """, (user_id, base_month, month))
         
-        if end_date:
-            query += " AND t.date <= ?"
-            params.append(end_date)
+        checkpoints = []
+        for summary in rows:
+            balance += summary["net"]
+            checkpoints.append((user_id, summary["month"], balance))
+        if not checkpoints or checkpoints[-1][1] != month:
+            checkpoints.append((user_id, month, balance))
         
-        self.cursor.execute(query, params)
-        result = self.cursor.fetchone()
+        self._save_checkpoints(conn, checkpoints)
+        return balance
+    
+    @staticmethod
+    def _save_checkpoints(conn, checkpoints):
+        """Grava os pontos de controle calculados, sem esperar pelo bloqueio de escrita.
         
-        self.close()
+        A gravação acontece na mesma transação da leitura: se outra conexão
+        está gravando ou gravou depois do instantâneo lido (o que poderia
+        invalidar os pontos), o SQLite recusa na hora e os pontos são apenas
+        descartados; a leitura nunca espera por uma importação em andamento.
+        """
+        timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+        conn.execute("PRAGMA busy_timeout = 0")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO balance_checkpoints (user_id, month, balance) VALUES (?, ?, ?)",
+                checkpoints
+            )
+        except sqlite3.OperationalError as e:
+            # SQLITE_BUSY ("database is locked"): fica para uma próxima consulta
+            if "locked" not in str(e) and "busy" not in str(e):
+                raise
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {int(timeout)}")
+    
+    @routed_by_user
+    def get_daily_net(self, user_id):
+        """Movimento líquido (receitas - despesas, em centavos) de cada dia do usuário.
         
-        if result:
-            total_income = result["total_income"] or 0
-            total_expense = result["total_expense"] or 0
-            return total_income - total_expense
+        Lido do resumo diário, que também cobre os anos arquivados; retorna
+        uma lista de pares (dia, centavos) em ordem de dia.
+        """
+        query = """
+        SELECT s.day,
+               SUM(CASE WHEN c.type = 'income' THEN s.total ELSE -s.total END) as net
+        FROM daily_summary s
+        JOIN categories c ON s.category_id = c.id
+        WHERE s.user_id = ?
+        GROUP BY s.day
+        ORDER BY s.day
+        """
         
-        return 0
+        with self.connection() as conn:
+            return [(row["day"], row["net"]) for row in conn.execute(query, (user_id,))]
     
+    @routed_by_user
     def get_monthly_summary(self, user_id, year, month):
         """Obtém o resumo mensal de receitas e despesas"""
-        conn = self.connect()
+        # Chave do mês na tabela de resumo mensal
+        month_key = f"{year}-{month:02d}"
         
-        # Formata as datas para o mês específico
-        start_date = f"{year}-{month:02d}-01"
+        summaries = self._get_summaries(user_id, month_key, month_key)
+        return summaries.get(month_key) or self._empty_summary()
+    
+    @routed_by_user
+    def get_yearly_summary(self, user_id, year):
+        """Obtém os resumos dos 12 meses do ano em uma única consulta.
         
-        # Determina o último dia do mês
-        if month == 12:
-            next_month_year = year + 1
-            next_month = 1
-        else:
-            next_month_year = year
-            next_month = month + 1
-        
-        end_date = f"{next_month_year}-{next_month:02d}-01"
-        
-        # Consulta para obter receitas por categoria
-        income_query = """
-        SELECT c.name, SUM(t.amount) as total
-        FROM transactions t
-        JOIN categories c ON t.category_id = c.id
-        WHERE t.user_id = ? AND c.type = 'income'
-        AND t.date >= ? AND t.date < ?
-        GROUP BY c.name
-        ORDER BY total DESC
+        Retorna um dicionário {mês (1-12): resumo}, no mesmo formato de
+        get_monthly_summary.
         """
+        summaries = self._get_summaries(user_id, f"{year}-01", f"{year}-12")
         
-        # Consulta para obter despesas por categoria
-        expense_query = """
-        SELECT c.name, SUM(t.amount) as total
-        FROM transactions t
-        JOIN categories c ON t.category_id = c.id
-        WHERE t.user_id = ? AND c.type = 'expense'
-        AND t.date >= ? AND t.date < ?
-        GROUP BY c.name
-        ORDER BY total DESC
-        """
+        return {
+            month: summaries.get(f"{year}-{month:02d}") or self._empty_summary()
+            for month in range(1, 13)
+        }
+    
+    def _get_summaries(self, user_id, first_month, last_month):
+        """Lê receitas e despesas por categoria dos meses no intervalo.
         
-        self.cursor.execute(income_query, (user_id, start_date, end_date))
-        income_categories = [dict(row) for row in self.cursor.fetchall()]
+        Uma única consulta agrupa por (mês, tipo, categoria); o total de
+        cada tipo no mês vem de uma função de janela sobre o mesmo resultado.
+        """
+        query = """
+        SELECT s.month, c.type, c.name, SUM(s.total) as total,
+               SUM(SUM(s.total)) OVER (PARTITION BY s.month, c.type) as type_total
+        FROM monthly_summary s
+        JOIN categories c ON s.category_id = c.id
+        WHERE s.user_id = ? AND s.month >= ? AND s.month <= ?
+        GROUP BY s.month, c.type, c.name
+        ORDER BY s.month, c.type, total DESC
+        """
         
-        self.cursor.execute(expense_query, (user_id, start_date, end_date))
-        expense_categories = [dict(row) for row in self.cursor.fetchall()]
+        with self.connection() as conn:
+            rows = conn.execute(query, (user_id, first_month, last_month)).fetchall()
         
-        # Calcula totais
-        total_income = sum(item["total"] for item in income_categories)
-        total_expense = sum(item["total"] for item in expense_categories)
+        summaries = {}
+        for row in rows:
+            summary = summaries.get(row["month"])
+            if summary is None:
+                summary = summaries[row["month"]] = self._empty_summary()
+            
+            group = summary[row["type"]]
+            group["categories"].append({"name": row["name"], "total": from_cents(row["total"])})
+            group["total"] = from_cents(row["type_total"])
         
-        self.close()
+        for summary in summaries.values():
+            summary["balance"] = summary["income"]["total"] - summary["expense"]["total"]
         
+        return summaries
+    
+    @staticmethod
+    def _empty_summary():
+        """Resumo de um mês sem movimentação"""
         return {
             "income": {
-                "categories": income_categories,
-                "total": total_income
+                "categories": [],
+                "total": from_cents(0)
             },
             "expense": {
-                "categories": expense_categories,
-                "total": total_expense
+                "categories": [],
+                "total": from_cents(0)
             },
-            "balance": total_income - total_expense
+            "balance": from_cents(0)
         }
     
-    def backup_data(self, backup_path):
-        """Cria um backup do banco de dados"""
+    def rebuild_summaries(self):
+        """Reconstrói as tabelas de resumo diário/mensal (reparo)"""
+        if self.sharded:
+            return all([shard.rebuild_summaries() for shard in self.shards()])
+        
+        with self.connection() as conn:
+            try:
+                # Os anos arquivados também entram nos resumos
+                schemas = self._attach_archives(conn)
+                rebuild_summaries(conn)
+                for schema in schemas[1:]:
+                    add_archived_summaries(conn, schema)
+                conn.execute("DELETE FROM balance_checkpoints")
+                conn.commit()
+                return True
+            except sqlite3.Error as e:
+                conn.rollback()
+                print(f"Erro ao reconstruir os resumos: {e}")
+                return False
+    
+    # Páginas copiadas por etapa nos backups; entre as etapas o banco fica livre
+    BACKUP_PAGES_PER_STEP = 1024
+    
+    def backup_data(self, backup_path, progress_callback=None):
+        """Cria um backup do banco de dados.
+        
+        Usa a API de backup do SQLite, copiando o banco em etapas sem
+        bloquear as demais conexões e sem risco de capturar um arquivo pela
+        metade. progress_callback(paginas_copiadas, total_paginas) é chamado
+        a cada etapa.
+        """
         try:
-            import shutil
-            shutil.copy2(self.db_path, backup_path)
+            target = sqlite3.connect(backup_path)
+            try:
+                with self.connection() as conn:
+                    conn.backup(
+                        target,
+                        pages=self.BACKUP_PAGES_PER_STEP,
+                        progress=self._backup_progress(progress_callback)
+                    )
+            finally:
+                target.close()
             return True
         except Exception as e:
             print(f"Erro ao criar backup: {e}")
             return False
     
-    def restore_backup(self, backup_path):
-        """Restaura um backup do banco de dados"""
+    def restore_backup(self, backup_path, progress_callback=None):
+        """Restaura um backup do banco de dados.
+        
+        O backup é copiado para um arquivo temporário, validado (PRAGMA
+        integrity_check e tabelas do aplicativo) e atualizado para o esquema
+        atual; só então substitui o banco atual, de forma atômica. Um backup
+        inválido não altera o banco em uso.
+        """
+        temp_path = self.db_path.with_name(self.db_path.name + ".restore")
+        
         try:
-            self.close()  # Fecha qualquer conexão existente
-            import shutil
-            shutil.copy2(backup_path, self.db_path)
+            # URI montada por as_uri(): caminhos com "#" ou "?" não podem ser
+            # truncados (o SQLite criaria um banco vazio em outro arquivo)
+            source = sqlite3.connect(Path(backup_path).resolve().as_uri() + "?mode=ro", uri=True)
+            target = sqlite3.connect(temp_path)
+            target.row_factory = sqlite3.Row
+            try:
+                source.backup(
+                    target,
+                    pages=self.BACKUP_PAGES_PER_STEP,
+                    progress=self._backup_progress(progress_callback)
+                )
+                
+                result = target.execute("PRAGMA integrity_check").fetchone()[0]
+                if result != "ok":
+                    raise sqlite3.DatabaseError(f"Backup corrompido: {result}")
+                self._check_backup_schema(target)
+                
+                # Atualiza o esquema caso o backup seja de uma versão anterior
+                apply_migrations(target)
+            finally:
+                source.close()
+                target.close()
+            
+            # Fecha as conexões do pool e troca o arquivo de uma só vez; os
+            # arquivos -wal/-shm do banco antigo não podem sobreviver à troca
+            self.close()
+            for suffix in ("-wal", "-shm"):
+                leftover = self.db_path.with_name(self.db_path.name + suffix)
+                if leftover.exists():
+                    leftover.unlink()
+            os.replace(temp_path, self.db_path)
+            
+            self._invalidate_category_ids()
             return True
         except Exception as e:
             print(f"Erro ao restaurar backup: {e}")
+            if temp_path.exists():
+                temp_path.unlink()
             return False
     
-    def export_to_csv(self, user_id, file_path, start_date=None, end_date=None):
-        """Exporta transações para CSV"""
+    @staticmethod
+    def _check_backup_schema(conn):
+        """Confere se o arquivo é um banco deste aplicativo, de versão suportada"""
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        missing = {"users", "categories", "transactions"} - tables
+        if missing:
+            raise sqlite3.DatabaseError(
+                f"O arquivo não é um backup válido (tabelas ausentes: {', '.join(sorted(missing))})"
+            )
+        
+        version = get_schema_version(conn)
+        if version > SCHEMA_VERSION:
+            raise sqlite3.DatabaseError(
+                f"Backup de uma versão mais nova do aplicativo (esquema {version} > {SCHEMA_VERSION})"
+            )
+    
+    @routed_by_user
+    def backup_user_data(self, user_id, backup_path, progress_callback=None):
+        """Cria um backup dos dados do usuário (fora do modo particionado, do banco inteiro)"""
+        return self.backup_data(backup_path, progress_callback)
+    
+    @routed_by_user
+    def restore_user_data(self, user_id, backup_path, progress_callback=None):
+        """Restaura um backup criado por backup_user_data"""
+        return self.restore_backup(backup_path, progress_callback)
+    
+    @staticmethod
+    def _backup_progress(progress_callback):
+        """Adapta o callback de progresso ao formato da API de backup"""
+        if progress_callback is None:
+            return None
+        
+        def progress(status, remaining, total):
+            progress_callback(total - remaining, total)
+        
+        return progress
+    
+    @routed_by_user
+    def export_to_csv(self, user_id, file_path, start_date=None, end_date=None, compress=None):
+        """Exporta transações para CSV.
+        
+        As linhas são lidas do cursor em lotes e gravadas diretamente no
+        arquivo. Com compress=True (padrão para arquivos .gz) a saída é
+        compactada com gzip durante a escrita.
+        """
         import csv
+        import gzip
         
-        transactions = self.get_transactions(user_id, start_date, end_date)
+        if compress is None:
+            compress = str(file_path).endswith('.gz')
         
         try:
-            with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
+            if compress:
+                csvfile = gzip.open(file_path, 'wt', newline='', encoding='utf-8')
+            else:
+                csvfile = open(file_path, 'w', newline='', encoding='utf-8', buffering=1024 * 1024)
+            
+            with csvfile:
                 fieldnames = ['date', 'category_name', 'description', 'amount', 'category_type']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                writer = csv.writer(csvfile)
                 
-                writer.writeheader()
-                for transaction in transactions:
-                    writer.writerow({
-                        'date': transaction['date'],
-                        'category_name': transaction['category_name'],
-                        'description': transaction['description'],
-                        'amount': transaction['amount'],
-                        'category_type': transaction['category_type']
-                    })
+                writer.writerow(fieldnames)
+                writer.writerows(
+                    [transaction[field] for field in fieldnames]
+                    for transaction in self.iter_transactions(user_id, start_date, end_date)
+                )
             
             return True
         except Exception as e:
             print(f"Erro ao exportar para CSV: {e}")
             return False
     
-    def import_from_csv(self, user_id, file_path):
-        """Importa transações de um arquivo CSV"""
+    @routed_by_user
+    def import_from_csv(self, user_id, file_path, chunk_size=1000, progress_callback=None,
+                        skip_duplicates=True):
+        """Importa transações de um arquivo CSV.
+        
+        O arquivo é lido em fluxo e gravado em blocos de chunk_size linhas,
+        de modo que o uso de memória não depende do tamanho do arquivo.
+        progress_callback(linhas_lidas, linhas_importadas) é chamado a cada
+        bloco. Retorna um relatório com as contagens, ou False em caso de erro.
+        
+        Linhas iguais (mesma impressão digital) a transações já gravadas antes
+        da importação são contadas em "duplicates" e, com skip_duplicates,
+        ignoradas; assim extratos com períodos sobrepostos podem ser reimportados.
+        """
         import csv
         
+        report = {
+            "imported": 0,
+            "rejected": 0,
+            "rejected_lines": [],  # (linha, motivo), limitado a MAX_REJECTED_LINES
+            "duplicates": 0,
+            "created_categories": 0
+        }
+        
         try:
-            conn = self.connect()
-            
-            with open(file_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
+            with self.transaction() as conn:
+                # Só transações anteriores à importação contam como repetidas; o
+                # dicionário guarda apenas as impressões digitais encontradas nelas
+                last_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM transactions").fetchone()[0]
+                existing = {}
+                
+                def flush(chunk):
+                    new_rows = self._filter_duplicates(conn, user_id, chunk, existing, last_id)
+                    report["duplicates"] += len(chunk) - len(new_rows)
+                    if not skip_duplicates:
+                        new_rows = chunk
+                    if new_rows:
+                        self._insert_transactions(conn, new_rows)
+                        report["imported"] += len(new_rows)
                 
-                for row in reader:
-                    # Busca o ID da categoria pelo nome
-                    self.cursor.execute(
-                        "SELECT id FROM categories WHERE name = ? AND type = ?",
-                        (row['category_name'], row['category_type'])
+                # Catálogo de categorias carregado uma única vez: (nome, tipo) -> id
+                categories = {
+                    (row["name"], row["type"]): row["id"]
+                    for row in conn.execute(
+                        "SELECT id, name, type FROM categories WHERE user_id IS NULL OR user_id = ?",
+                        (user_id,)
                     )
+                }
+                
+                with open(file_path, 'r', encoding='utf-8', newline='') as csvfile:
+                    reader = csv.DictReader(csvfile)
+                    chunk = []
+                    rows_read = 0
                     
-                    category = self.cursor.fetchone()
-                    if not category:
-                        # Cria a categoria se não existir
-                        self.cursor.execute(
-                            "INSERT INTO categories (name, type, user_id) VALUES (?, ?, ?)",
-                            (row['category_name'], row['category_type'], user_id)
-                        )
-                        category_id = self.cursor.lastrowid
-                    else:
-                        category_id = category['id']
+                    for row in reader:
+                        rows_read += 1
+                        try:
+                            params = self._parse_csv_row(conn, user_id, row, categories, report)
+                        except (KeyError, TypeError, ValueError) as e:
+                            report["rejected"] += 1
+                            if len(report["rejected_lines"]) < self.MAX_REJECTED_LINES:
+                                report["rejected_lines"].append((reader.line_num, str(e)))
+                            continue
+                        
+                        chunk.append(params)
+                        if len(chunk) >= chunk_size:
+                            flush(chunk)
+                            chunk = []
+                            if progress_callback:
+                                progress_callback(rows_read, report["imported"])
                     
-                    # Insere a transação
-                    self.cursor.execute(
-                        "INSERT INTO transactions (date, amount, description, category_id, user_id) VALUES (?, ?, ?, ?, ?)",
-                        (row['date'], float(row['amount']), row['description'], category_id, user_id)
-                    )
+                    if chunk:
+                        flush(chunk)
+                    if progress_callback:
+                        progress_callback(rows_read, report["imported"])
             
-            conn.commit()
-            self.close()
-            return True
+            return report
         except Exception as e:
             print(f"Erro ao importar do CSV: {e}")
-            self.close()
-            return False
\ No newline at end of file
+            return False
+        finally:
+            if report["created_categories"]:
+                self._invalidate_category_ids(user_id)
+    
+    @staticmethod
+    def _filter_duplicates(conn, user_id, chunk, existing, last_id):
+        """Retorna as linhas do bloco que ainda não estavam gravadas.
+        
+        existing guarda, por impressão digital, quantas transações anteriores
+        à importação (id <= last_id) ainda não foram casadas; cada uma casa com
+        uma única linha, de modo que lançamentos legitimamente repetidos no
+        arquivo são mantidos. Impressões digitais sem transação anterior não são
+        guardadas, então a memória não cresce com o tamanho do arquivo.
+        """
+        unknown = list({params[6] for params in chunk} - existing.keys())
+        for start in range(0, len(unknown), 500):
+            batch = unknown[start:start + 500]
+            placeholders = ", ".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT fingerprint, COUNT(*) FROM transactions "
+                f"WHERE user_id = ? AND id <= ? AND fingerprint IN ({placeholders}) GROUP BY fingerprint",
+                (user_id, last_id, *batch)
+            )
+            existing.update(rows.fetchall())
+        
+        new_rows = []
+        for params in chunk:
+            if existing.get(params[6], 0) > 0:
+                existing[params[6]] -= 1
+            else:
+                new_rows.append(params)
+        return new_rows
+    
+    def _parse_csv_row(self, conn, user_id, row, categories, report):
+        """Valida uma linha do CSV e retorna os parâmetros do INSERT"""
+        # Linhas com menos colunas que o cabeçalho trazem None nos campos ausentes
+        date = (row.get('date') or "").strip()
+        day = date_to_day(date)  # Também valida o formato YYYY-MM-DD
+        amount = to_cents(row.get('amount') or "")
+        
+        name = (row.get('category_name') or "").strip()
+        type_ = (row.get('category_type') or "").strip()
+        if not name or type_ not in ("income", "expense"):
+            raise ValueError(f"Categoria inválida: {name!r} ({type_!r})")
+        
+        category_id = categories.get((name, type_))
+        if category_id is None:
+            # Cria a categoria uma única vez e passa a reutilizá-la
+            cursor = conn.execute(
+                "INSERT INTO categories (name, type, user_id) VALUES (?, ?, ?)",
+                (name, type_, user_id)
+            )
+            category_id = cursor.lastrowid
+            categories[(name, type_)] = category_id
+            report["created_categories"] += 1
+        
+        description = row.get('description')
+        fingerprint = transaction_fingerprint(day, amount, description, category_id, user_id)
+        return (date, day, amount, description, category_id, user_id, fingerprint)
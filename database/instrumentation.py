@@ -0,0 +1,298 @@
+"""Instrumentação das consultas ao banco de dados.
+
+Quando ativada, mede o tempo de cada instrução SQL executada pelas conexões
+do pool e de cada método público do DatabaseManager, guarda contagens e
+histogramas de latência e registra as instruções lentas com o plano de
+execução (EXPLAIN QUERY PLAN). Desativada, não adiciona custo às conexões.
+"""
+
+import atexit
+import functools
+import inspect
+import logging
+import sqlite3
+import sys
+import threading
+import time
+
+
+logger = logging.getLogger("database.slow_queries")
+
+# Limites superiores (em ms) das faixas do histograma de latência
+HISTOGRAM_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, float("inf"))
+
+_enabled = False
+_slow_threshold = 0.1  # segundos
+_report_registered = False
+_lock = threading.Lock()
+_method_stats = {}     # nome do método -> LatencyStats
+_statement_stats = {}  # SQL normalizado -> LatencyStats
+_current = threading.local()
+
+
+class LatencyStats:
+    """Contagem, tempo total e histograma de latências de uma chave"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * len(HISTOGRAM_BUCKETS)
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        elapsed_ms = elapsed * 1000
+        for i, limit in enumerate(HISTOGRAM_BUCKETS):
+            if elapsed_ms <= limit:
+                self.histogram[i] += 1
+                break
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "avg_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "histogram": {
+                (f"<={limit:g}ms" if limit != float("inf") else f">{HISTOGRAM_BUCKETS[-2]:g}ms"): n
+                for limit, n in zip(HISTOGRAM_BUCKETS, self.histogram)
+            },
+        }
+
+
+def _normalize(sql):
+    """Remove espaços redundantes para agrupar instruções iguais"""
+    return " ".join(sql.split())
+
+
+def _record(table, key, elapsed):
+    with _lock:
+        stats = table.get(key)
+        if stats is None:
+            stats = table[key] = LatencyStats()
+        stats.add(elapsed)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que mede o tempo de execute/executemany e das leituras (fetch*)"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._finish(sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            # Os parâmetros de executemany já foram consumidos: sem plano no log
+            self._finish(sql, None, time.perf_counter() - start)
+
+    # O tempo de leitura das linhas entra no total da última instrução executada
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self._add_fetch_time(time.perf_counter() - start)
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            self._add_fetch_time(time.perf_counter() - start)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._add_fetch_time(time.perf_counter() - start)
+
+    def _finish(self, sql, parameters, elapsed):
+        statement = self._statement = _normalize(sql)
+        _record(_statement_stats, statement, elapsed)
+        if elapsed >= _slow_threshold:
+            _log_slow(self.connection, statement, parameters, elapsed)
+
+    def _add_fetch_time(self, elapsed):
+        statement = getattr(self, "_statement", None)
+        if statement is None:
+            return
+        with _lock:
+            stats = _statement_stats.get(statement)
+            if stats is not None:
+                stats.total += elapsed
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Conexão cujos cursores (inclusive os de conn.execute) são instrumentados"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute do módulo sqlite3 não passa pelo execute do cursor
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _log_slow(conn, statement, parameters, elapsed):
+    """Registra uma instrução lenta junto com o seu plano de execução"""
+    method = getattr(_current, "method", None) or "?"
+    plan = []
+    if parameters is not None and statement.split(" ", 1)[0].upper() in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE"):
+        try:
+            # Cursor comum para que o próprio EXPLAIN não seja medido
+            rows = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+            plan = [row[3] for row in rows]
+        except sqlite3.Error:
+            pass
+
+    logger.warning(
+        "Consulta lenta (%.1f ms) em %s: %s%s",
+        elapsed * 1000, method, statement,
+        "".join(f"\n    {line}" for line in plan),
+    )
+
+
+def connection_factory():
+    """Classe de conexão que o pool deve usar em novas conexões"""
+    return InstrumentedConnection if _enabled else sqlite3.Connection
+
+
+def instrument_methods(exclude=()):
+    """Decorador de classe: mede cada método público quando a instrumentação está ativa"""
+    def decorate(cls):
+        for name, attr in list(vars(cls).items()):
+            if name.startswith("_") or name in exclude:
+                continue
+            if isinstance(attr, (staticmethod, classmethod)) or not callable(attr):
+                continue
+            setattr(cls, name, _instrument_method(f"{cls.__name__}.{name}", attr))
+        return cls
+    return decorate
+
+
+def _instrument_method(name, func):
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            if not _enabled:
+                yield from func(*args, **kwargs)
+                return
+            # Soma apenas o tempo gasto dentro do gerador, não o do consumidor
+            gen = func(*args, **kwargs)
+            elapsed = 0.0
+            try:
+                while True:
+                    start = time.perf_counter()
+                    previous, _current.method = getattr(_current, "method", None), name
+                    try:
+                        item = next(gen)
+                    except StopIteration:
+                        return
+                    finally:
+                        _current.method = previous
+                        elapsed += time.perf_counter() - start
+                    yield item
+            finally:
+                gen.close()
+                _record(_method_stats, name, elapsed)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        previous, _current.method = getattr(_current, "method", None), name
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record(_method_stats, name, time.perf_counter() - start)
+            _current.method = previous
+    return wrapper
+
+
+def enable_instrumentation(slow_query_ms=100, log_file=None, report_at_exit=True):
+    """Ativa a instrumentação.
+
+    Deve ser chamada antes de abrir as conexões (ou seguida de configure_pools),
+    pois só as conexões novas são instrumentadas.
+    """
+    global _enabled, _slow_threshold, _report_registered
+
+    _slow_threshold = slow_query_ms / 1000
+    _enabled = True
+
+    if log_file is not None and not logger.handlers:
+        handler = logging.FileHandler(log_file, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+
+    if report_at_exit and not _report_registered:
+        atexit.register(dump_report)
+        _report_registered = True
+
+
+def disable_instrumentation():
+    """Desativa a instrumentação (as estatísticas coletadas são mantidas)"""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset_stats():
+    """Descarta as estatísticas coletadas"""
+    with _lock:
+        _method_stats.clear()
+        _statement_stats.clear()
+
+
+def get_report():
+    """Retorna as estatísticas por método e por instrução, das mais custosas às menos"""
+    with _lock:
+        methods = {name: stats.as_dict() for name, stats in _method_stats.items()}
+        statements = {sql: stats.as_dict() for sql, stats in _statement_stats.items()}
+
+    def by_total(items):
+        return dict(sorted(items.items(), key=lambda item: item[1]["total_ms"], reverse=True))
+
+    return {"methods": by_total(methods), "statements": by_total(statements)}
+
+
+def format_report(limit=20):
+    """Resumo legível das estatísticas coletadas"""
+    report = get_report()
+    lines = []
+    for title, entries in (("Métodos", report["methods"]), ("Instruções SQL", report["statements"])):
+        lines.append(f"{title} (por tempo total):")
+        lines.append(f"  {'chamadas':>9} {'total ms':>10} {'média ms':>9} {'máx ms':>9}  nome")
+        for name, stats in list(entries.items())[:limit]:
+            if len(name) > 120:
+                name = name[:117] + "..."
+            lines.append(
+                f"  {stats['count']:>9} {stats['total_ms']:>10.1f} {stats['avg_ms']:>9.2f} "
+                f"{stats['max_ms']:>9.1f}  {name}"
+            )
+        lines.append("")
+    return "\n".join(lines)
+
+
+def dump_report(file=None, limit=20):
+    """Escreve o resumo no arquivo informado (padrão: stderr)"""
+    if not _method_stats and not _statement_stats:
+        return
+    print(format_report(limit), file=file or sys.stderr)
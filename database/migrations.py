@@ -0,0 +1,559 @@
+"""Migrações versionadas do esquema do banco de dados.
+
+A versão aplicada fica registrada em ``PRAGMA user_version``; cada migração
+é executada uma única vez, em ordem, sobre bancos já existentes.
+"""
+
+import sqlite3
+from ults.helpers import transaction_fingerprint
+
+
+# Expressão SQL que converte uma data ISO no número do dia (ordinal, 0001-01-01 = 1),
+# o mesmo valor de datetime.date.toordinal()
+DAY_NUMBER_SQL = "CAST(julianday({}) - 1721424.5 AS INTEGER)"
+
+
+# ---------------------------------------------------------------------------
+# Migrações. Cada uma descreve o esquema da sua versão e não deve ser
+# alterada depois de publicada; mudanças novas entram como nova migração.
+# ---------------------------------------------------------------------------
+
+def _migration_1_indexes(conn):
+    """Índices para as consultas de transações e categorias"""
+    # Remove categorias duplicadas antes de criar o índice único,
+    # redirecionando as transações para a categoria mantida
+    conn.execute("""
+    UPDATE transactions
+    SET category_id = (
+        SELECT MIN(c2.id) FROM categories c1
+        JOIN categories c2
+          ON c2.name = c1.name AND c2.type = c1.type
+         AND IFNULL(c2.user_id, 0) = IFNULL(c1.user_id, 0)
+        WHERE c1.id = transactions.category_id
+    )
+    WHERE category_id IN (SELECT id FROM categories)
+    """)
+    conn.execute("""
+    DELETE FROM categories
+    WHERE id NOT IN (
+        SELECT MIN(id) FROM categories GROUP BY name, type, IFNULL(user_id, 0)
+    )
+    """)
+
+    _create_date_indexes(conn)
+    # user_id NULL (categorias padrão) é tratado como 0 para que o índice
+    # também impeça duplicatas entre as categorias compartilhadas
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_categories_name_type_user "
+        "ON categories (name, type, IFNULL(user_id, 0))"
+    )
+    conn.execute("ANALYZE")
+
+
+def _migration_2_summaries(conn):
+    """Tabelas de resumo diário e mensal mantidas por gatilhos"""
+    _create_date_summary_tables(conn, "REAL")
+    _create_date_summary_triggers(conn)
+    _rebuild_date_summaries(conn)
+
+
+def _migration_3_integer_cents(conn):
+    """Valores passam a ser gravados em centavos inteiros (antes REAL)"""
+    # O SQLite não altera o tipo de uma coluna: a tabela é recriada
+    conn.execute("""
+    CREATE TABLE transactions_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        amount INTEGER NOT NULL,  -- centavos
+        description TEXT,
+        category_id INTEGER,
+        user_id INTEGER,
+        FOREIGN KEY (category_id) REFERENCES categories (id),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    """)
+    conn.execute("""
+    INSERT INTO transactions_new (id, date, amount, description, category_id, user_id)
+    SELECT id, date, CAST(ROUND(amount * 100) AS INTEGER), description, category_id, user_id
+    FROM transactions
+    """)
+    conn.execute("DROP TABLE transactions")
+    conn.execute("ALTER TABLE transactions_new RENAME TO transactions")
+    _create_date_indexes(conn)
+
+    # Resumos recriados com totais inteiros
+    conn.execute("DROP TABLE daily_summary")
+    conn.execute("DROP TABLE monthly_summary")
+    _create_date_summary_tables(conn, "INTEGER")
+    _create_date_summary_triggers(conn)
+    _rebuild_date_summaries(conn)
+
+
+def _migration_4_day_numbers(conn):
+    """Coluna inteira 'day' (número do dia) para os filtros por período"""
+    conn.execute("ALTER TABLE transactions ADD COLUMN day INTEGER")
+    conn.execute(f"UPDATE transactions SET day = {DAY_NUMBER_SQL.format('date')}")
+
+    conn.execute("DROP INDEX IF EXISTS idx_transactions_user_date")
+    conn.execute("DROP INDEX IF EXISTS idx_transactions_user_category_date")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transactions_user_day "
+        "ON transactions (user_id, day)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transactions_user_category_day "
+        "ON transactions (user_id, category_id, day)"
+    )
+
+    # Resumo diário passa a ser indexado pelo número do dia
+    conn.execute("DROP TABLE daily_summary")
+    conn.execute("""
+    CREATE TABLE daily_summary (
+        user_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        category_id INTEGER NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day, category_id)
+    ) WITHOUT ROWID
+    """)
+    create_summary_triggers(conn)
+    rebuild_summaries(conn)
+    conn.execute("ANALYZE")
+
+
+def _migration_5_description_search(conn):
+    """Índice de texto completo (FTS5) sobre transactions.description"""
+    try:
+        conn.execute("""
+        CREATE VIRTUAL TABLE transactions_fts USING fts5(
+            description,
+            content='transactions',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """)
+    except sqlite3.OperationalError:
+        # SQLite compilado sem FTS5: a busca usa LIKE (ver has_description_index)
+        return
+
+    conn.execute("""
+    CREATE TRIGGER trg_transactions_fts_insert AFTER INSERT ON transactions
+    BEGIN
+        INSERT INTO transactions_fts (rowid, description) VALUES (NEW.id, NEW.description);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER trg_transactions_fts_delete AFTER DELETE ON transactions
+    BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, description)
+        VALUES ('delete', OLD.id, OLD.description);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER trg_transactions_fts_update AFTER UPDATE OF description ON transactions
+    BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, description)
+        VALUES ('delete', OLD.id, OLD.description);
+        INSERT INTO transactions_fts (rowid, description) VALUES (NEW.id, NEW.description);
+    END
+    """)
+    conn.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+
+
+def _migration_6_fingerprints(conn):
+    """Impressão digital do conteúdo de cada transação, para importações sem duplicatas"""
+    conn.execute("ALTER TABLE transactions ADD COLUMN fingerprint INTEGER")
+    # Função registrada só nesta conexão; as gravações novas calculam o valor em Python
+    conn.create_function("transaction_fingerprint", 5, transaction_fingerprint, deterministic=True)
+    conn.execute("""
+    UPDATE transactions
+    SET fingerprint = transaction_fingerprint(day, amount, description, category_id, user_id)
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transactions_user_fingerprint "
+        "ON transactions (user_id, fingerprint)"
+    )
+
+
+def _migration_7_archives(conn):
+    """Registro dos anos movidos para os bancos de arquivo morto"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS archives (
+        year INTEGER PRIMARY KEY,
+        file_name TEXT NOT NULL,  -- relativo ao diretório de arquivo morto
+        rows INTEGER NOT NULL DEFAULT 0,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+def _migration_8_balance_checkpoints(conn):
+    """Saldo acumulado ao fim de cada mês encerrado, por usuário"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS balance_checkpoints (
+        user_id INTEGER NOT NULL,
+        month TEXT NOT NULL,  -- 'YYYY-MM'
+        balance INTEGER NOT NULL,  -- centavos, todas as transações até o fim do mês
+        PRIMARY KEY (user_id, month)
+    ) WITHOUT ROWID
+    """)
+
+    # Uma transação invalida os pontos de controle do seu mês em diante; eles
+    # são recalculados sob demanda (ver DatabaseManager.get_balance)
+    conn.execute("""
+    CREATE TRIGGER trg_transactions_checkpoint_insert AFTER INSERT ON transactions
+    BEGIN
+        DELETE FROM balance_checkpoints
+        WHERE user_id = NEW.user_id AND month >= substr(NEW.date, 1, 7);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER trg_transactions_checkpoint_delete AFTER DELETE ON transactions
+    BEGIN
+        DELETE FROM balance_checkpoints
+        WHERE user_id = OLD.user_id AND month >= substr(OLD.date, 1, 7);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER trg_transactions_checkpoint_update
+    AFTER UPDATE OF date, amount, category_id, user_id ON transactions
+    BEGIN
+        DELETE FROM balance_checkpoints
+        WHERE user_id = OLD.user_id AND month >= substr(OLD.date, 1, 7);
+        DELETE FROM balance_checkpoints
+        WHERE user_id = NEW.user_id AND month >= substr(NEW.date, 1, 7);
+    END
+    """)
+
+
+# Lista ordenada de migrações; a posição + 1 é a versão resultante
+MIGRATIONS = [
+    _migration_1_indexes,
+    _migration_2_summaries,
+    _migration_3_integer_cents,
+    _migration_4_day_numbers,
+    _migration_5_description_search,
+    _migration_6_fingerprints,
+    _migration_7_archives,
+    _migration_8_balance_checkpoints,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+# ---------------------------------------------------------------------------
+# Gatilhos e resumos do esquema atual
+# ---------------------------------------------------------------------------
+
+# Corpo dos gatilhos que somam (NEW) ou subtraem (OLD) uma transação dos resumos.
+# O dia é calculado a partir de 'date' para não depender da ordem dos gatilhos.
+_SUMMARY_ADD = f"""
+    INSERT INTO daily_summary (user_id, day, category_id, total, count)
+    VALUES (NEW.user_id, {DAY_NUMBER_SQL.format('NEW.date')}, NEW.category_id, NEW.amount, 1)
+    ON CONFLICT (user_id, day, category_id)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+    INSERT INTO monthly_summary (user_id, month, category_id, total, count)
+    VALUES (NEW.user_id, substr(NEW.date, 1, 7), NEW.category_id, NEW.amount, 1)
+    ON CONFLICT (user_id, month, category_id)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+"""
+
+_SUMMARY_REMOVE = f"""
+    UPDATE daily_summary SET total = total - OLD.amount, count = count - 1
+    WHERE user_id = OLD.user_id AND day = {DAY_NUMBER_SQL.format('OLD.date')}
+    AND category_id = OLD.category_id;
+    DELETE FROM daily_summary
+    WHERE user_id = OLD.user_id AND day = {DAY_NUMBER_SQL.format('OLD.date')}
+    AND category_id = OLD.category_id AND count <= 0;
+    UPDATE monthly_summary SET total = total - OLD.amount, count = count - 1
+    WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7) AND category_id = OLD.category_id;
+    DELETE FROM monthly_summary
+    WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7) AND category_id = OLD.category_id
+    AND count <= 0;
+"""
+
+
+def create_summary_triggers(conn):
+    """(Re)cria os gatilhos que mantêm daily_summary, monthly_summary e 'day'"""
+    _create_summary_triggers(conn, _SUMMARY_ADD, _SUMMARY_REMOVE)
+
+    # Preenche 'day' quando a transação é gravada sem ele ou tem a data alterada
+    conn.execute("DROP TRIGGER IF EXISTS trg_transactions_day_insert")
+    conn.execute("DROP TRIGGER IF EXISTS trg_transactions_day_update")
+    conn.execute(f"""
+    CREATE TRIGGER trg_transactions_day_insert AFTER INSERT ON transactions
+    WHEN NEW.day IS NULL
+    BEGIN
+        UPDATE transactions SET day = {DAY_NUMBER_SQL.format('NEW.date')} WHERE id = NEW.id;
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER trg_transactions_day_update AFTER UPDATE OF date ON transactions
+    BEGIN
+        UPDATE transactions SET day = {DAY_NUMBER_SQL.format('NEW.date')} WHERE id = NEW.id;
+    END
+    """)
+
+
+def rebuild_summaries(conn):
+    """Recalcula as tabelas de resumo a partir das transações"""
+    conn.execute("DELETE FROM daily_summary")
+    conn.execute("DELETE FROM monthly_summary")
+    conn.execute(f"""
+    INSERT INTO daily_summary (user_id, day, category_id, total, count)
+    SELECT user_id, {DAY_NUMBER_SQL.format('date')}, category_id, SUM(amount), COUNT(*)
+    FROM transactions
+    WHERE user_id IS NOT NULL AND category_id IS NOT NULL
+    GROUP BY user_id, {DAY_NUMBER_SQL.format('date')}, category_id
+    """)
+    conn.execute("""
+    INSERT INTO monthly_summary (user_id, month, category_id, total, count)
+    SELECT user_id, substr(date, 1, 7), category_id, SUM(amount), COUNT(*)
+    FROM transactions
+    WHERE user_id IS NOT NULL AND category_id IS NOT NULL
+    GROUP BY user_id, substr(date, 1, 7), category_id
+    """)
+
+
+def create_archive_tables(conn, schema):
+    """Cria a tabela de transações de um banco de arquivo morto anexado como 'schema'"""
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {schema}.transactions (
+        id INTEGER PRIMARY KEY,
+        date TEXT NOT NULL,
+        day INTEGER NOT NULL,
+        amount INTEGER NOT NULL,  -- centavos
+        description TEXT,
+        category_id INTEGER,
+        user_id INTEGER,
+        fingerprint INTEGER
+    )
+    """)
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS {schema}.idx_transactions_user_day "
+        f"ON transactions (user_id, day)"
+    )
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS {schema}.idx_transactions_user_category_day "
+        f"ON transactions (user_id, category_id, day)"
+    )
+
+
+def add_archived_summaries(conn, schema):
+    """Soma aos resumos as transações do banco de arquivo morto anexado como 'schema'"""
+    conn.execute(f"""
+    INSERT INTO daily_summary (user_id, day, category_id, total, count)
+    SELECT user_id, day, category_id, SUM(amount), COUNT(*)
+    FROM {schema}.transactions
+    WHERE user_id IS NOT NULL AND category_id IS NOT NULL
+    GROUP BY user_id, day, category_id
+    ON CONFLICT (user_id, day, category_id)
+    DO UPDATE SET total = total + excluded.total, count = count + excluded.count
+    """)
+    conn.execute(f"""
+    INSERT INTO monthly_summary (user_id, month, category_id, total, count)
+    SELECT user_id, substr(date, 1, 7), category_id, SUM(amount), COUNT(*)
+    FROM {schema}.transactions
+    WHERE user_id IS NOT NULL AND category_id IS NOT NULL
+    GROUP BY user_id, substr(date, 1, 7), category_id
+    ON CONFLICT (user_id, month, category_id)
+    DO UPDATE SET total = total + excluded.total, count = count + excluded.count
+    """)
+
+
+def _create_summary_triggers(conn, add_sql, remove_sql):
+    """Cria os gatilhos de resumo com os corpos informados"""
+    conn.execute("DROP TRIGGER IF EXISTS trg_transactions_summary_insert")
+    conn.execute("DROP TRIGGER IF EXISTS trg_transactions_summary_delete")
+    conn.execute("DROP TRIGGER IF EXISTS trg_transactions_summary_update_old")
+    conn.execute("DROP TRIGGER IF EXISTS trg_transactions_summary_update_new")
+
+    conn.execute(f"""
+    CREATE TRIGGER trg_transactions_summary_insert AFTER INSERT ON transactions
+    WHEN NEW.user_id IS NOT NULL AND NEW.category_id IS NOT NULL
+    BEGIN {add_sql} END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER trg_transactions_summary_delete AFTER DELETE ON transactions
+    WHEN OLD.user_id IS NOT NULL AND OLD.category_id IS NOT NULL
+    BEGIN {remove_sql} END
+    """)
+    # Atualizações são tratadas como remoção dos valores antigos + inclusão dos novos
+    conn.execute(f"""
+    CREATE TRIGGER trg_transactions_summary_update_old
+    AFTER UPDATE OF date, amount, category_id, user_id ON transactions
+    WHEN OLD.user_id IS NOT NULL AND OLD.category_id IS NOT NULL
+    BEGIN {remove_sql} END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER trg_transactions_summary_update_new
+    AFTER UPDATE OF date, amount, category_id, user_id ON transactions
+    WHEN NEW.user_id IS NOT NULL AND NEW.category_id IS NOT NULL
+    BEGIN {add_sql} END
+    """)
+
+
+# ---------------------------------------------------------------------------
+# Definições das versões 1 a 3 (resumo diário por data em texto), mantidas
+# apenas para que as migrações antigas continuem reproduzíveis
+# ---------------------------------------------------------------------------
+
+def _create_date_indexes(conn):
+    """Índices por data em texto (versões 1 a 3)"""
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transactions_user_date "
+        "ON transactions (user_id, date)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transactions_user_category_date "
+        "ON transactions (user_id, category_id, date)"
+    )
+
+
+def _create_date_summary_tables(conn, total_type):
+    """Tabelas de resumo das versões 2 e 3"""
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS daily_summary (
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        total {total_type} NOT NULL DEFAULT 0,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, date, category_id)
+    ) WITHOUT ROWID
+    """)
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS monthly_summary (
+        user_id INTEGER NOT NULL,
+        month TEXT NOT NULL,  -- 'YYYY-MM'
+        category_id INTEGER NOT NULL,
+        total {total_type} NOT NULL DEFAULT 0,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, month, category_id)
+    ) WITHOUT ROWID
+    """)
+
+
+def _create_date_summary_triggers(conn):
+    """Gatilhos de resumo das versões 2 e 3"""
+    _create_summary_triggers(conn, """
+    INSERT INTO daily_summary (user_id, date, category_id, total, count)
+    VALUES (NEW.user_id, NEW.date, NEW.category_id, NEW.amount, 1)
+    ON CONFLICT (user_id, date, category_id)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+    INSERT INTO monthly_summary (user_id, month, category_id, total, count)
+    VALUES (NEW.user_id, substr(NEW.date, 1, 7), NEW.category_id, NEW.amount, 1)
+    ON CONFLICT (user_id, month, category_id)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+    """, """
+    UPDATE daily_summary SET total = total - OLD.amount, count = count - 1
+    WHERE user_id = OLD.user_id AND date = OLD.date AND category_id = OLD.category_id;
+    DELETE FROM daily_summary
+    WHERE user_id = OLD.user_id AND date = OLD.date AND category_id = OLD.category_id
+    AND count <= 0;
+    UPDATE monthly_summary SET total = total - OLD.amount, count = count - 1
+    WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7) AND category_id = OLD.category_id;
+    DELETE FROM monthly_summary
+    WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7) AND category_id = OLD.category_id
+    AND count <= 0;
+    """)
+
+
+def _rebuild_date_summaries(conn):
+    """Preenche os resumos das versões 2 e 3"""
+    conn.execute("DELETE FROM daily_summary")
+    conn.execute("DELETE FROM monthly_summary")
+    conn.execute("""
+    INSERT INTO daily_summary (user_id, date, category_id, total, count)
+    SELECT user_id, date, category_id, SUM(amount), COUNT(*)
+    FROM transactions
+    WHERE user_id IS NOT NULL AND category_id IS NOT NULL
+    GROUP BY user_id, date, category_id
+    """)
+    conn.execute("""
+    INSERT INTO monthly_summary (user_id, month, category_id, total, count)
+    SELECT user_id, substr(date, 1, 7), category_id, SUM(total), SUM(count)
+    FROM daily_summary
+    GROUP BY user_id, substr(date, 1, 7), category_id
+    """)
+
+
+def has_description_index(conn):
+    """Indica se o índice FTS5 das descrições existe neste banco"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions_fts'"
+    ).fetchone()
+    return row is not None
+
+
+def get_schema_version(conn):
+    """Retorna a versão do esquema gravada no banco"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn):
+    """Aplica as migrações pendentes; retorna a versão final do esquema"""
+    version = get_schema_version(conn)
+
+    while version < SCHEMA_VERSION:
+        try:
+            # Obtém o bloqueio de escrita antes de reler a versão: outra conexão
+            # (ex.: interface e servidor iniciando juntos) pode ter aplicado a
+            # migração enquanto esta aguardava, e nenhuma pode rodar duas vezes
+            conn.execute("BEGIN IMMEDIATE")
+            version = get_schema_version(conn)
+            if version >= SCHEMA_VERSION:
+                conn.rollback()
+                break
+            MIGRATIONS[version](conn)
+            # PRAGMA não aceita parâmetros; a versão é sempre um inteiro
+            conn.execute(f"PRAGMA user_version = {int(version + 1)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version += 1
+
+    return version
+
+
+# Consultas críticas e os índices que o planejador deve escolher para elas
+HOT_QUERIES = {
+    "get_transactions": (
+        "SELECT t.id FROM transactions t JOIN categories c ON t.category_id = c.id "
+        "WHERE t.user_id = ? AND t.day >= ? AND t.day <= ? ORDER BY t.day DESC, t.id DESC",
+        (1, 730120, 730485),
+    ),
+    "get_balance": (
+        "SELECT SUM(s.total) FROM daily_summary s JOIN categories c ON s.category_id = c.id "
+        "WHERE s.user_id = ? AND s.day >= ? AND s.day <= ?",
+        (1, 730120, 730485),
+    ),
+    "get_transactions_by_category": (
+        "SELECT t.id FROM transactions t "
+        "WHERE t.user_id = ? AND t.category_id = ? AND t.day >= ? AND t.day <= ?",
+        (1, 1, 730120, 730485),
+    ),
+    "category_lookup": (
+        "SELECT id FROM categories WHERE name = ? AND type = ? AND IFNULL(user_id, 0) = ?",
+        ("Salário", "income", 0),
+    ),
+}
+
+
+def check_query_plans(conn):
+    """Verifica se as consultas críticas usam índice em vez de varredura.
+
+    Retorna um dicionário {consulta: (usa_indice, [linhas do plano])}.
+    """
+    results = {}
+    for name, (query, params) in HOT_QUERIES.items():
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+        # "SCAN t" / "SCAN transactions" indica leitura completa da tabela
+        full_scan = any(
+            detail.startswith("SCAN") and "USING" not in detail
+            for detail in plan
+        )
+        results[name] = (not full_scan, plan)
+    return results
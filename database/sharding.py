@@ -0,0 +1,225 @@
+"""Particionamento do banco por usuário (um arquivo SQLite por usuário).
+
+No modo particionado o banco principal (data/finance_manager.db) passa a
+ser apenas o diretório: usuários, autenticação e categorias padrão. As
+transações, categorias próprias, resumos e arquivos mortos de cada usuário
+ficam em data/tenants/<banco>_user_<id>.db, de modo que gravações de
+usuários diferentes não disputam o mesmo bloqueio e o backup de um usuário
+copia apenas os dados dele.
+
+O modo é ativado pela configuração "db_sharding" (ver database.bootstrap). Para
+dividir um banco existente (a partir da raiz do projeto):
+
+    python -m database.sharding            # cria os bancos dos usuários
+    python -m database.sharding --purge    # e remove as transações do banco principal
+"""
+
+import argparse
+import functools
+import inspect
+import sys
+from pathlib import Path
+from database.migrations import create_archive_tables, add_archived_summaries
+
+# Diretório (dentro de data/) com os bancos dos usuários
+TENANTS_DIR = "tenants"
+
+_enabled = False
+
+
+def configure_sharding(enabled):
+    """Ativa ou desativa o modo particionado para os DatabaseManager criados depois"""
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def is_enabled():
+    return _enabled
+
+
+def tenant_db_name(db_name, user_id):
+    """Nome do banco do usuário, relativo ao diretório data/"""
+    return f"{TENANTS_DIR}/{Path(db_name).stem}_user_{int(user_id)}.db"
+
+
+def routed_by_user(func):
+    """Decorador: no modo particionado, executa o método no banco do usuário.
+
+    O usuário é o primeiro argumento do método (user_id); sem usuário, o
+    método é executado no banco principal.
+    """
+    def target(self, args, kwargs):
+        user_id = args[0] if args else kwargs.get("user_id")
+        if not self.sharded or user_id is None:
+            return self
+        return self.shard(user_id)
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(self, *args, **kwargs):
+            yield from func(target(self, args, kwargs), *args, **kwargs)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        return func(target(self, args, kwargs), *args, **kwargs)
+    return wrapper
+
+
+def split_database(db_name="finance_manager.db", purge=False):
+    """Copia os dados de cada usuário do banco principal para o banco dele.
+
+    Os ids de transações e categorias são preservados; os anos arquivados
+    são copiados para arquivos mortos próprios do usuário. Usuários que já
+    têm banco com dados são ignorados, então a divisão pode ser repetida
+    após uma falha. Com purge=True, as transações e categorias próprias
+    saem do banco principal ao final (os arquivos mortos antigos não são
+    apagados). Retorna {user_id: transações copiadas}, ou False em caso de erro.
+    """
+    from database.db_manager import DatabaseManager
+
+    directory = DatabaseManager(db_name, sharded=False)
+    directory.setup_database()
+
+    with directory.connection() as conn:
+        user_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM users UNION SELECT DISTINCT user_id FROM transactions "
+            "WHERE user_id IS NOT NULL ORDER BY 1"
+        )]
+    archives = directory.get_archives()
+
+    copied = {}
+    for user_id in user_ids:
+        tenant = DatabaseManager(tenant_db_name(db_name, user_id), sharded=False)
+        tenant.setup_database()
+
+        with tenant.connection() as conn:
+            has_data = conn.execute(
+                "SELECT EXISTS (SELECT 1 FROM transactions) OR EXISTS (SELECT 1 FROM archives)"
+            ).fetchone()[0]
+        if has_data:
+            print(f"Usuário {user_id}: banco já existe, ignorado")
+            continue
+
+        try:
+            copied[user_id] = _copy_user(directory, tenant, user_id, archives)
+        except Exception as e:
+            print(f"Erro ao dividir os dados do usuário {user_id}: {e}")
+            # Remove o banco incompleto para que a divisão possa ser repetida
+            tenant.close()
+            for suffix in ("", "-wal", "-shm"):
+                leftover = tenant.db_path.with_name(tenant.db_path.name + suffix)
+                if leftover.exists():
+                    leftover.unlink()
+            return False
+        print(f"Usuário {user_id}: {copied[user_id]} transação(ões) copiada(s)")
+
+    if purge:
+        _purge_directory(directory)
+
+    return copied
+
+
+def _copy_user(directory, tenant, user_id, archives):
+    """Copia categorias, transações e anos arquivados de um usuário"""
+    columns = "id, date, day, amount, description, category_id, user_id, fingerprint"
+
+    with tenant.connection() as conn:
+        conn.execute("ATTACH DATABASE ? AS source", (str(directory.db_path),))
+        try:
+            with tenant.transaction():
+                # As categorias padrão do banco novo são substituídas pelas do
+                # banco principal, mantendo os ids usados nas transações
+                conn.execute("DELETE FROM main.categories")
+                conn.execute(
+                    "INSERT INTO main.categories (id, name, type, user_id) "
+                    "SELECT id, name, type, user_id FROM source.categories "
+                    "WHERE user_id IS NULL OR user_id = ?",
+                    (user_id,)
+                )
+                cursor = conn.execute(
+                    f"INSERT INTO main.transactions ({columns}) "
+                    f"SELECT {columns} FROM source.transactions WHERE user_id = ?",
+                    (user_id,)
+                )
+                rows = cursor.rowcount
+        finally:
+            conn.execute("DETACH DATABASE source")
+
+        tenant.archive_dir.mkdir(parents=True, exist_ok=True)
+        for archive in archives:
+            rows += _copy_archive(directory, tenant, conn, user_id, archive)
+
+    tenant._invalidate_category_ids()
+    return rows
+
+
+def _copy_archive(directory, tenant, conn, user_id, archive):
+    """Copia as linhas do usuário de um arquivo morto para um arquivo morto próprio"""
+    source_path = directory.archive_dir / archive["file_name"]
+    if not source_path.exists():
+        raise FileNotFoundError(f"arquivo morto de {archive['year']} não encontrado ({source_path})")
+
+    year = archive["year"]
+    file_name = f"{tenant.db_path.stem}_{year}.db"
+    schema = f"archive_{year}"
+    columns = "id, date, day, amount, description, category_id, user_id, fingerprint"
+
+    conn.execute("ATTACH DATABASE ? AS source_archive", (str(source_path),))
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(tenant.archive_dir / file_name),))
+    try:
+        with tenant.transaction():
+            create_archive_tables(conn, schema)
+            cursor = conn.execute(
+                f"INSERT OR IGNORE INTO {schema}.transactions ({columns}) "
+                f"SELECT {columns} FROM source_archive.transactions WHERE user_id = ?",
+                (user_id,)
+            )
+            rows = cursor.rowcount
+            if rows:
+                add_archived_summaries(conn, schema)
+                conn.execute(
+                    "INSERT INTO archives (year, file_name, rows) VALUES (?, ?, ?)",
+                    (year, file_name, rows)
+                )
+    finally:
+        conn.execute("DETACH DATABASE source_archive")
+        conn.execute(f"DETACH DATABASE {schema}")
+
+    if not rows:
+        (tenant.archive_dir / file_name).unlink(missing_ok=True)
+    return rows
+
+
+def _purge_directory(directory):
+    """Deixa no banco principal apenas usuários e categorias padrão"""
+    with directory.transaction() as conn:
+        conn.execute("DELETE FROM transactions")
+        conn.execute("DELETE FROM categories WHERE user_id IS NOT NULL")
+        conn.execute("DELETE FROM daily_summary")
+        conn.execute("DELETE FROM monthly_summary")
+        conn.execute("DELETE FROM balance_checkpoints")
+        conn.execute("DELETE FROM archives")
+
+    with directory.connection() as conn:
+        conn.execute("VACUUM")
+    directory._invalidate_category_ids()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Divide o banco principal em um banco por usuário")
+    parser.add_argument("--db", default="finance_manager.db", help="banco principal (dentro de data/)")
+    parser.add_argument("--purge", action="store_true",
+                        help="remove do banco principal os dados copiados")
+    args = parser.parse_args(argv)
+
+    copied = split_database(args.db, purge=args.purge)
+    if copied is False:
+        return 1
+
+    print(f"{len(copied)} usuário(s) dividido(s); ative \"db_sharding\" nas configurações para usá-los")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,15 +4,20 @@ from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                             QLineEdit, QFormLayout, QDialog, QMessageBox,
                             QFileDialog, QCheckBox, QGroupBox, QStackedWidget,
                             QSplitter, QFrame, QToolButton, QMenu, QAction,
-                            QSpinBox, QDoubleSpinBox, QRadioButton, QButtonGroup)
+                            QSpinBox, QDoubleSpinBox, QRadioButton, QButtonGroup,
+                            QInputDialog)
 from PyQt5.QtCore import Qt, QDate, QDateTime, QSize
 from PyQt5.QtGui import QFont, QIcon, QPixmap, QColor
 from backend.finance_manager import FinanceManager
+from gui.workers import BackupWorker, ImportWorker, create_write_queue
 import datetime
 import calendar
 import os
 
 class MainWindow(QMainWindow):
+    # Quantidade de lançamentos carregados por página na tabela
+    TRANSACTIONS_PAGE_SIZE = 200
+    
     def __init__(self, auth_manager):
         super().__init__()
         
@@ -22,6 +27,14 @@ class MainWindow(QMainWindow):
         # Inicializa o gerenciador financeiro
         self.finance_manager = FinanceManager(self.user["id"])
         
+        # Lançamentos da interface são gravados em segundo plano
+        self.write_queue, self.write_signals = create_write_queue(self.finance_manager, self)
+        self.write_signals.written.connect(self.on_transactions_written)
+        self.write_signals.failed.connect(self.on_transaction_failed)
+        
+        # Há lançamentos gravados que a tabela e o saldo ainda não mostram
+        self.writes_not_shown = False
+        
         # Configurações de tema
         self.theme = self.user["settings"]["theme"]
         self.font_family = self.user["settings"]["font_family"]
@@ -186,6 +199,9 @@ class MainWindow(QMainWindow):
         action_layout.addWidget(edit_button)
         action_layout.addWidget(delete_button)
         
+        # Botões que alteram os dados, desativados durante importações e restaurações
+        self.data_action_buttons = [add_button, edit_button, delete_button]
+        
         # Botões de zoom
         zoom_layout = QHBoxLayout()
         
@@ -241,9 +257,17 @@ class MainWindow(QMainWindow):
             "Importar Backup"
         ]
         
+        function_actions = {
+            "Exportar Backup": self.export_backup,
+            "Importar Backup": self.import_backup
+        }
+        
         for text in function_buttons:
             button = QPushButton(text)
             button.setMinimumHeight(40)
+            if text in function_actions:
+                button.clicked.connect(function_actions[text])
+                self.data_action_buttons.append(button)
             functions_layout.addWidget(button)
         
         sidebar_layout.addWidget(search_group)
@@ -261,19 +285,44 @@ class MainWindow(QMainWindow):
         self.transactions_table.setSelectionBehavior(QTableWidget.SelectRows)
         self.transactions_table.setEditTriggers(QTableWidget.NoEditTriggers)
         
+        # Campo de busca pela descrição
+        self.transactions_search_input = QLineEdit()
+        self.transactions_search_input.setPlaceholderText("Buscar na descrição...")
+        self.transactions_search_input.setMinimumHeight(40)
+        self.transactions_search_input.setClearButtonEnabled(True)
+        self.transactions_search_input.returnPressed.connect(self.search_transactions)
+        self.transactions_search_input.textChanged.connect(
+            lambda text: self.load_transactions() if not text else None
+        )
+        
+        table_layout = QVBoxLayout()
+        table_layout.addWidget(self.transactions_search_input)
+        table_layout.addWidget(self.transactions_table)
+        
         # Layout da página
         content_layout = QHBoxLayout()
         content_layout.addLayout(sidebar_layout)
-        content_layout.addWidget(self.transactions_table, 3)
+        content_layout.addLayout(table_layout, 3)
         
         # Botão de selecionar tudo
         select_all_button = QPushButton("Selecionar Tudo")
         select_all_button.setMinimumHeight(40)
         select_all_button.clicked.connect(self.select_all_transactions)
         
+        # Botão para carregar a próxima página de lançamentos
+        self.load_more_button = QPushButton("Carregar mais")
+        self.load_more_button.setMinimumHeight(40)
+        self.load_more_button.clicked.connect(self.load_more_transactions)
+        
+        bottom_layout = QHBoxLayout()
+        bottom_layout.addStretch()
+        bottom_layout.addWidget(select_all_button)
+        bottom_layout.addWidget(self.load_more_button)
+        bottom_layout.addStretch()
+        
         layout.addLayout(header_layout)
         layout.addLayout(content_layout)
-        layout.addWidget(select_all_button, alignment=Qt.AlignCenter)
+        layout.addLayout(bottom_layout)
         
         self.content_stack.addWidget(page)
     
@@ -409,6 +458,7 @@ class MainWindow(QMainWindow):
         import_button = QPushButton("Importar")
         import_button.setMinimumHeight(40)
         import_button.clicked.connect(self.import_csv)
+        self.data_action_buttons.append(import_button)
         
         back_button = QPushButton("Voltar")
         back_button.setMinimumHeight(40)
@@ -760,20 +810,54 @@ class MainWindow(QMainWindow):
         self.transactions_balance_label.setStyleSheet(f"color: {balance_color};")
     
     def load_transactions(self):
-        """Carrega as transações na tabela"""
-        # Obtém as transações
-        transactions = self.finance_manager.get_transactions()
-        
+        """Carrega a primeira página de transações na tabela"""
         # Limpa a tabela
         self.transactions_table.setRowCount(0)
+        self.transactions_next_page = None
+        
+        # O "Acumulado" parte do saldo atual e desce junto com as transações
+        self.transactions_accumulated = self.finance_manager.get_balance()
+        
+        self.load_more_transactions()
+    
+    def load_more_transactions(self):
+        """Acrescenta a próxima página de transações à tabela"""
+        # Obtém apenas as transações que serão exibidas
+        page = self.finance_manager.get_transactions_page(
+            after=self.transactions_next_page, limit=self.TRANSACTIONS_PAGE_SIZE
+        )
+        self.transactions_next_page = page["next"]
+        self.load_more_button.setEnabled(page["next"] is not None)
+        
+        self.append_transaction_rows(page["transactions"])
+    
+    def search_transactions(self):
+        """Exibe as transações cuja descrição contém o texto buscado"""
+        text = self.transactions_search_input.text().strip()
+        if not text:
+            self.load_transactions()
+            return
+        
+        transactions = self.finance_manager.search_transactions(text, limit=self.TRANSACTIONS_PAGE_SIZE)
+        
+        self.transactions_table.setRowCount(0)
+        self.transactions_next_page = None
+        self.load_more_button.setEnabled(False)
         
+        # Resultados da busca não são contíguos: o "Acumulado" é o saldo ao fim do dia
+        self.append_transaction_rows(transactions, running=False)
+    
+    def append_transaction_rows(self, transactions, running=True):
+        """Acrescenta transações ao final da tabela"""
         # Preenche a tabela
-        accumulated = 0
-        for i, transaction in enumerate(transactions):
+        accumulated = self.transactions_accumulated if running else None
+        for transaction in transactions:
+            i = self.transactions_table.rowCount()
             self.transactions_table.insertRow(i)
             
-            # Data
+            # Data (guarda o id da transação para edição/exclusão)
             date_item = QTableWidgetItem(transaction["date"])
+            date_item.setData(Qt.UserRole, transaction["id"])
             self.transactions_table.setItem(i, 0, date_item)
             
             # Categoria
@@ -798,15 +882,22 @@ class MainWindow(QMainWindow):
             amount_item.setForeground(QColor(amount_color))
             self.transactions_table.setItem(i, 3, amount_item)
             
-            # Acumulado
-            accumulated += amount
-            accumulated_item = QTableWidgetItem(f"{accumulated:.2f}")
+            # Acumulado: saldo logo após a transação
+            if running:
+                balance = accumulated
+                accumulated -= amount
+            else:
+                balance = self.finance_manager.get_balance(end_date=transaction["date"])
+            accumulated_item = QTableWidgetItem(f"{balance:.2f}")
             self.transactions_table.setItem(i, 4, accumulated_item)
             
             # Checkbox
             checkbox = QTableWidgetItem()
             checkbox.setCheckState(Qt.Unchecked)
             self.transactions_table.setItem(i, 5, checkbox)
+        
+        if running:
+            self.transactions_accumulated = accumulated
     
     def show_add_transaction_dialog(self):
         """Exibe o diálogo para adicionar uma nova transação"""
@@ -888,6 +979,21 @@ class MainWindow(QMainWindow):
         
         income_radio.toggled.connect(update_categories)
         
+        # Cadastra uma nova categoria do tipo selecionado
+        def add_category():
+            name, ok = QInputDialog.getText(dialog, "Nova categoria", "Nome da categoria:")
+            name = name.strip()
+            if not ok or not name:
+                return
+            
+            type_ = "income" if income_radio.isChecked() else "expense"
+            category_id = self.finance_manager.add_category(name, type_)
+            
+            update_categories()
+            category_combo.setCurrentIndex(category_combo.findData(category_id))
+        
+        add_category_button.clicked.connect(add_category)
+        
         # Descrição
         description_layout = QVBoxLayout()
         description_label = QLabel("Descrição:")
@@ -938,12 +1044,10 @@ class MainWindow(QMainWindow):
                     QMessageBox.warning(dialog, "Descrição vazia", "Por favor, forneça uma descrição.")
                     return
                 
-                # Adiciona a transação
-                self.finance_manager.add_transaction(date, amount, description, category_id)
-                
-                # Atualiza a interface
-                self.update_balance()
-                self.load_transactions()
+                # Enfileira a transação; a interface é atualizada quando a
+                # gravação terminar (on_transactions_written)
+                self.write_queue.submit((date, amount, description, category_id))
+                self.statusBar().showMessage("Gravando lançamento...")
                 
                 # Fecha o diálogo
                 dialog.accept()
@@ -955,6 +1059,43 @@ class MainWindow(QMainWindow):
         
         dialog.exec_()
     
+    def on_transactions_written(self, written):
+        """Atualiza a interface depois que um lote de lançamentos foi gravado"""
+        self.statusBar().showMessage(f"{len(written)} lançamento(s) gravado(s)", 3000)
+        self.writes_not_shown = True
+        
+        # Lançamentos ainda na fila serão seguidos de outro aviso
+        if self.write_queue.pending():
+            return
+        
+        self.refresh_after_writes()
+    
+    def refresh_after_writes(self):
+        """Mostra na tabela e no saldo os lançamentos gravados pela fila"""
+        self.writes_not_shown = False
+        self.update_balance()
+        self.load_transactions()
+    
+    def on_transaction_failed(self, row, message):
+        """Informa um lançamento que não pôde ser gravado"""
+        self.statusBar().clearMessage()
+        date, amount, description, _ = row
+        QMessageBox.critical(
+            self,
+            "Erro",
+            f"Não foi possível gravar o lançamento \"{description}\" ({date}, {amount:.2f}): {message}"
+        )
+        
+        # Um lote que falhou por inteiro não gera aviso de gravação: atualiza
+        # aqui os lançamentos anteriores que esperavam o fim da fila
+        if self.writes_not_shown and not self.write_queue.pending():
+            self.refresh_after_writes()
+    
+    def closeEvent(self, event):
+        """Grava os lançamentos pendentes antes de fechar a janela"""
+        self.write_queue.close()
+        super().closeEvent(event)
+    
     def edit_selected_transaction(self):
         """Edita a transação selecionada"""
         # Verifica se há uma linha selecionada
@@ -995,8 +1136,17 @@ class MainWindow(QMainWindow):
         )
         
         if confirm == QMessageBox.Yes:
-            # Implementação da exclusão (simplificada)
-            QMessageBox.information(self, "Excluir", "Funcionalidade de exclusão a ser implementada.")
+            transaction_ids = [
+                self.transactions_table.item(i, 0).data(Qt.UserRole) for i in selected_rows
+            ]
+            deleted = self.finance_manager.delete_transactions(transaction_ids)
+            
+            if deleted < len(transaction_ids):
+                QMessageBox.warning(self, "Excluir", "Não foi possível excluir todas as transações selecionadas.")
+            
+            # Atualiza a interface
+            self.update_balance()
+            self.load_transactions()
     
     def select_all_transactions(self):
         """Seleciona todas as transações"""
@@ -1033,9 +1183,50 @@ class MainWindow(QMainWindow):
             "Arquivos CSV (*.csv)"
         )
         
-        if file_path:
-            # Implementação simplificada
-            QMessageBox.information(self, "Importar CSV", f"Arquivo selecionado: {file_path}")
+        if not file_path:
+            return
+        
+        # A importação ocupa o bloqueio de escrita até o fim: grava antes os
+        # lançamentos da fila e bloqueia novas alterações enquanto ela roda
+        self.write_queue.flush()
+        self.set_data_actions_enabled(False)
+        self.import_worker = ImportWorker(self.finance_manager, file_path, self)
+        
+        def show_progress(rows_read, rows_imported):
+            self.statusBar().showMessage(
+                f"Importando... {rows_read} linha(s) lida(s), {rows_imported} importada(s)"
+            )
+        
+        def finish(report):
+            self.statusBar().clearMessage()
+            self.set_data_actions_enabled(True)
+            
+            if not report:
+                QMessageBox.critical(self, "Importar CSV", "Não foi possível importar o arquivo.")
+                return
+            
+            message = f"{report['imported']} lançamento(s) importado(s)."
+            if report["duplicates"]:
+                message += f"\n{report['duplicates']} lançamento(s) já existente(s) ignorado(s)."
+            if report["rejected"]:
+                message += f"\n{report['rejected']} linha(s) rejeitada(s):"
+                for line, reason in report["rejected_lines"][:10]:
+                    message += f"\n  Linha {line}: {reason}"
+            
+            QMessageBox.information(self, "Importar CSV", message)
+            
+            # Atualiza a interface
+            self.update_balance()
+            self.load_transactions()
+        
+        self.import_worker.progress.connect(show_progress)
+        self.import_worker.completed.connect(finish)
+        self.import_worker.start()
+    
+    def set_data_actions_enabled(self, enabled):
+        """Ativa ou desativa os botões que alteram os dados"""
+        for button in self.data_action_buttons:
+            button.setEnabled(enabled)
     
     def export_data(self):
         """Exporta dados para um arquivo"""
@@ -1047,7 +1238,7 @@ class MainWindow(QMainWindow):
                 self,
                 "Salvar arquivo CSV",
                 "",
-                "Arquivos CSV (*.csv)"
+                "Arquivos CSV (*.csv);;CSV compactado (*.csv.gz)"
             )
         else:  # PDF
             file_path, _ = QFileDialog.getSaveFileName(
@@ -1057,10 +1248,88 @@ class MainWindow(QMainWindow):
                 "Arquivos PDF (*.pdf)"
             )
         
-        if file_path:
+        if not file_path:
+            return
+        
+        if format_type == "CSV":
+            start_date = self.start_date.date().toString("yyyy-MM-dd")
+            end_date = self.end_date.date().toString("yyyy-MM-dd")
+            
+            if self.finance_manager.export_to_csv(file_path, start_date, end_date):
+                QMessageBox.information(self, "Exportar", f"Arquivo salvo: {file_path}")
+            else:
+                QMessageBox.critical(self, "Exportar", "Não foi possível exportar os dados.")
+        else:
             # Implementação simplificada
             QMessageBox.information(self, "Exportar", f"Arquivo salvo: {file_path}")
     
+    def export_backup(self):
+        """Salva um backup do banco de dados sem travar a interface"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Salvar backup",
+            "",
+            "Banco de dados (*.db)"
+        )
+        
+        if file_path:
+            self.run_backup_worker(self.finance_manager.backup_data, file_path, "Backup salvo com sucesso.")
+    
+    def import_backup(self):
+        """Restaura um backup do banco de dados sem travar a interface"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Selecionar backup",
+            "",
+            "Banco de dados (*.db)"
+        )
+        
+        if not file_path:
+            return
+        
+        confirm = QMessageBox.question(
+            self,
+            "Importar Backup",
+            "Os dados atuais serão substituídos pelo backup. Deseja continuar?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        
+        if confirm != QMessageBox.Yes:
+            return
+        
+        # A restauração troca o arquivo do banco: grava antes os lançamentos da
+        # fila e suspende a fila (e os botões de alteração) até o fim
+        self.write_queue.flush()
+        self.set_data_actions_enabled(False)
+        
+        def restore(path, progress_callback):
+            with self.write_queue.paused():
+                return self.finance_manager.restore_backup(path, progress_callback)
+        
+        self.run_backup_worker(restore, file_path, "Backup restaurado com sucesso.")
+    
+    def run_backup_worker(self, operation, file_path, success_message):
+        """Executa uma operação de backup em segundo plano"""
+        self.backup_worker = BackupWorker(operation, file_path, self)
+        
+        def show_progress(copied, total):
+            percent = int(copied * 100 / total) if total else 100
+            self.statusBar().showMessage(f"Backup: {percent}%")
+        
+        def finish(success):
+            self.statusBar().clearMessage()
+            self.set_data_actions_enabled(True)
+            if success:
+                QMessageBox.information(self, "Backup", success_message)
+                self.update_balance()
+                self.load_transactions()
+            else:
+                QMessageBox.critical(self, "Backup", "Não foi possível concluir a operação de backup.")
+        
+        self.backup_worker.progress.connect(show_progress)
+        self.backup_worker.completed.connect(finish)
+        self.backup_worker.start()
+    
     def show_filter_dialog(self):
         """Exibe o diálogo de filtro para análise"""
         # Implementação simplificada
@@ -0,0 +1,88 @@
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from backend.write_queue import WriteQueue
+
+
+class BackupWorker(QThread):
+    """Executa backup/restauração fora da thread da interface"""
+    
+    progress = pyqtSignal(int, int)  # páginas copiadas, total de páginas
+    completed = pyqtSignal(bool)
+    
+    def __init__(self, operation, path, parent=None):
+        super().__init__(parent)
+        
+        # operation: FinanceManager.backup_data ou FinanceManager.restore_backup
+        self.operation = operation
+        self.path = path
+    
+    def run(self):
+        """Executa a operação emitindo o progresso de cada etapa"""
+        result = self.operation(self.path, self.progress.emit)
+        self.completed.emit(bool(result))
+
+
+class ImportWorker(QThread):
+    """Executa a importação de CSV fora da thread da interface"""
+    
+    progress = pyqtSignal(int, int)  # linhas lidas, linhas importadas
+    completed = pyqtSignal(object)  # relatório da importação (ou False)
+    
+    def __init__(self, finance_manager, path, parent=None):
+        super().__init__(parent)
+        self.finance_manager = finance_manager
+        self.path = path
+    
+    def run(self):
+        """Importa o arquivo emitindo o progresso a cada bloco gravado"""
+        report = self.finance_manager.import_from_csv(self.path, self.progress.emit)
+        self.completed.emit(report)
+
+
+class WriteQueueSignals(QObject):
+    """Leva os resultados da fila de gravação para a thread da interface"""
+    
+    written = pyqtSignal(list)  # [(linha, id)] gravados no mesmo commit
+    failed = pyqtSignal(object, str)  # linha rejeitada, mensagem de erro
+
+
+def create_write_queue(finance_manager, parent=None):
+    """Cria a fila de gravação do usuário e os sinais conectáveis à interface"""
+    signals = WriteQueueSignals(parent)
+    
+    # Os sinais são emitidos na thread da fila; o Qt entrega nos slots da interface
+    write_queue = WriteQueue(
+        finance_manager.add_transactions,
+        on_written=signals.written.emit,
+        on_failed=lambda row, error: signals.failed.emit(row, str(error))
+    )
+    return write_queue, signals
+
+
+class FutureWatcher(QObject):
+    """Entrega o resultado de um concurrent.futures.Future na thread da interface"""
+    
+    finished = pyqtSignal(object)  # resultado
+    failed = pyqtSignal(str)  # mensagem de erro
+    
+    def __init__(self, future, on_result, on_error=None, parent=None):
+        super().__init__(parent)
+        
+        # Os slots são conectados antes de observar o future: se ele já estiver
+        # concluído, _done é chamado imediatamente por add_done_callback
+        self.finished.connect(on_result)
+        if on_error:
+            self.failed.connect(on_error)
+        future.add_done_callback(self._done)
+    
+    def _done(self, future):
+        # Chamado na thread que concluiu o future; os sinais atravessam para a interface
+        error = future.exception()
+        if error is not None:
+            self.failed.emit(str(error))
+        else:
+            self.finished.emit(future.result())
+
+
+def watch_future(future, on_result, on_error=None, parent=None):
+    """Conecta callbacks da interface a um Future (ex.: AsyncFinance.submit)"""
+    return FutureWatcher(future, on_result, on_error, parent)
@@ -2,11 +2,17 @@ import sys
 from PyQt5.QtWidgets import QApplication
 from gui.login_window import LoginWindow
 from database.db_manager import DatabaseManager
+from database.connection_pool import shutdown_pools
+from database.bootstrap import configure_database
+from ults.settings_manager import SettingsManager
 
 def main():
     # Inicializa a aplicação
     app = QApplication(sys.argv)
     
+    # Aplica as configurações de banco (perfil do SQLite, instrumentação, particionamento)
+    configure_database(SettingsManager())
+    
     # Configura o banco de dados
     db_manager = DatabaseManager()
     db_manager.setup_database()
@@ -16,7 +22,11 @@ def main():
     login_window.show()
     
     # Executa a aplicação
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    
+    # Fecha as conexões do pool antes de sair
+    shutdown_pools()
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
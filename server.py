@@ -0,0 +1,33 @@
+import argparse
+import sys
+from backend.http_server import FinanceServer
+from database.connection_pool import shutdown_pools
+from database.bootstrap import configure_database
+from ults.settings_manager import SettingsManager
+
+def main(argv=None):
+    # Modo servidor: mesmas operações da interface, via HTTP/JSON em 127.0.0.1
+    parser = argparse.ArgumentParser(description="Servidor HTTP/JSON local do gerenciador financeiro")
+    parser.add_argument("--port", type=int, default=8765, help="porta em 127.0.0.1 (padrão: 8765)")
+    parser.add_argument("--workers", type=int, default=8, help="threads de atendimento (padrão: 8)")
+    args = parser.parse_args(argv)
+
+    # Aplica as mesmas configurações de banco da interface gráfica
+    configure_database(SettingsManager())
+
+    server = FinanceServer(args.port, args.workers)
+    print(f"Servidor em http://127.0.0.1:{server.server_address[1]} ({args.workers} threads); Ctrl+C encerra")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        # Fecha as conexões do pool antes de sair
+        shutdown_pools()
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Teste de carga do acesso concorrente ao banco.
+
+Várias threads gravam (inserções avulsas e em lote, exclusões, inclusive
+em meses já fechados) e leem (saldos, páginas, iteração) o mesmo banco ao
+mesmo tempo, por um FinanceManager e um DatabaseManager compartilhados. Ao
+final, o saldo do índice em memória, o saldo pelos pontos de controle
+mensais e a soma direta em SQL precisam coincidir.
+
+    python -m pytest tests/test_concurrency.py
+"""
+
+import random
+import sqlite3
+import threading
+from decimal import Decimal
+from backend.finance_manager import FinanceManager
+from database.db_manager import DatabaseManager
+from ults.helpers import from_cents
+
+WRITERS = 8
+READERS = 8
+OPERATIONS = 150
+
+# Períodos conferidos ao final (None = todo o histórico)
+PERIODS = [
+    (None, None),
+    ("2023-01-01", "2023-12-31"),
+    ("2022-06-01", "2024-03-31"),
+    (None, "2023-06-30"),
+]
+
+
+def _random_date(rng):
+    return f"{rng.randint(2022, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+
+def _sql_balance(db_path, user_id, start_date=None, end_date=None):
+    """Saldo somado diretamente das transações, sem resumos nem pontos de controle"""
+    conn = sqlite3.connect(db_path)
+    try:
+        total = conn.execute(
+            "SELECT COALESCE(SUM(CASE WHEN c.type = 'income' THEN t.amount ELSE -t.amount END), 0) "
+            "FROM transactions t JOIN categories c ON c.id = t.category_id "
+            "WHERE t.user_id = ? AND t.date >= ? AND t.date <= ?",
+            (user_id, start_date or "0000-00-00", end_date or "9999-12-31")
+        ).fetchone()[0]
+    finally:
+        conn.close()
+    return from_cents(total)
+
+
+def test_concurrent_reads_and_writes_keep_balances_consistent(tmp_path, monkeypatch):
+    # DatabaseManager usa data/ relativo ao diretório atual
+    monkeypatch.chdir(tmp_path)
+
+    db_manager = DatabaseManager()
+    db_manager.setup_database()
+    user_id = db_manager.register_user("carga", "senha", "Teste de carga")
+
+    finance = FinanceManager(user_id)
+    categories = [category["id"] for category in finance.get_categories()]
+    # Carrega o índice em memória: a partir daqui ele é atualizado a cada gravação
+    finance.get_daily_balances("2024-01-01", "2024-01-01")
+
+    errors = []
+    own_ids = []
+    ids_lock = threading.Lock()
+    start = threading.Barrier(WRITERS + READERS)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        try:
+            start.wait()
+            for _ in range(OPERATIONS):
+                choice = rng.random()
+                if choice < 0.5:
+                    amount = Decimal(rng.randint(1, 99999)) / 100
+                    new_id = finance.add_transaction(_random_date(rng), amount, "avulsa", rng.choice(categories))
+                    assert new_id, "add_transaction falhou"
+                    with ids_lock:
+                        own_ids.append(new_id)
+                elif choice < 0.8:
+                    rows = [(_random_date(rng), Decimal(rng.randint(1, 5000)) / 100, "lote", rng.choice(categories))
+                            for _ in range(rng.randint(1, 20))]
+                    new_ids = finance.add_transactions(rows)
+                    assert len(new_ids) == len(rows), "add_transactions falhou"
+                else:
+                    with ids_lock:
+                        victim = own_ids.pop(rng.randrange(len(own_ids))) if own_ids else None
+                    if victim is not None:
+                        assert finance.delete_transactions([victim]) == 1, "delete_transactions falhou"
+        except Exception as e:
+            errors.append(f"escrita: {e!r}")
+
+    def reader(seed):
+        rng = random.Random(seed)
+        try:
+            start.wait()
+            for _ in range(OPERATIONS):
+                start_date, end_date = rng.choice(PERIODS)
+                finance.get_balance(start_date, end_date)
+                # Calcula (e grava) pontos de controle que as escritas retroativas invalidam
+                db_manager.get_balance(user_id, start_date, end_date)
+                db_manager.get_transactions_page(user_id, limit=50, start_date=start_date, end_date=end_date)
+                for _ in zip(range(200), db_manager.iter_transactions(user_id, batch_size=50)):
+                    pass
+                finance.get_daily_balances("2023-12-01", "2023-12-31")
+        except Exception as e:
+            errors.append(f"leitura: {e!r}")
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(WRITERS)]
+    threads += [threading.Thread(target=reader, args=(100 + seed,)) for seed in range(READERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    try:
+        assert errors == []
+
+        for start_date, end_date in PERIODS:
+            expected = _sql_balance(db_manager.db_path, user_id, start_date, end_date)
+            # Índice em memória, atualizado incrementalmente durante a carga
+            assert finance.get_balance(start_date, end_date) == expected, (start_date, end_date)
+            # Resumos diários + pontos de controle mensais
+            assert db_manager.get_balance(user_id, start_date, end_date) == expected, (start_date, end_date)
+
+        # Índice recriado do zero a partir do banco
+        finance.invalidate_ledger()
+        assert finance.get_daily_balances("2024-12-31", "2024-12-31")[-1] == _sql_balance(db_manager.db_path, user_id)
+    finally:
+        db_manager.close()
@@ -1,13 +1,59 @@
 import datetime
 import calendar
+import hashlib
 import locale
 import os
 import platform
+import unicodedata
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 
 def format_currency(value):
     """Formata um valor como moeda (R$)"""
     return f"R$ {value:.2f}"
 
+def to_cents(value):
+    """Converte um valor em reais (Decimal, str, int ou float) para centavos inteiros"""
+    try:
+        # str() evita carregar o erro de representação binária dos floats
+        amount = Decimal(str(value)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f"Valor inválido: {value!r}")
+    return int(amount * 100)
+
+def from_cents(cents):
+    """Converte centavos inteiros para um Decimal em reais"""
+    return Decimal(cents or 0).scaleb(-2)
+
+def date_to_day(date):
+    """Converte uma data (ISO 'YYYY-MM-DD' ou date) no número do dia (ordinal)"""
+    if isinstance(date, str):
+        date_obj = datetime.date.fromisoformat(date)
+        # fromisoformat também aceita formatos como 'YYYYMMDD'; exige o ISO estendido
+        if date_obj.isoformat() != date:
+            raise ValueError(f"Data inválida: {date!r}")
+        date = date_obj
+    return date.toordinal()
+
+def day_to_date(day):
+    """Converte o número do dia (ordinal) de volta para datetime.date"""
+    return datetime.date.fromordinal(day)
+
+def normalize_description(description):
+    """Normaliza a descrição para comparação: sem acentos, caixa e espaços extras"""
+    text = unicodedata.normalize("NFKD", description or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.casefold().split())
+
+def transaction_fingerprint(day, amount_cents, description, category_id, user_id):
+    """Impressão digital (inteiro de 64 bits) do conteúdo de uma transação.
+    
+    Transações com mesma data, valor, descrição normalizada, categoria e
+    usuário têm a mesma impressão digital (usada para detectar reimportações).
+    """
+    key = f"{user_id}|{day}|{amount_cents}|{category_id}|{normalize_description(description)}"
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
 def format_date(date_str, output_format="%d/%m/%Y"):
     """Formata uma data no formato desejado"""
     if isinstance(date_str, str):
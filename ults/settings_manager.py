@@ -19,7 +19,12 @@ class SettingsManager:
             "backup_dir": str(Path("data/backups")),
             "export_dir": str(Path("data/exports")),
             "auto_backup": True,
-            "backup_interval": 7  # dias
+            "backup_interval": 7,  # dias
+            "db_profile": "balanced",  # safe, balanced ou fast
+            "db_pragmas": {},  # ajustes individuais sobre o perfil, ex.: {"cache_size": -131072}
+            "db_instrumentation": False,  # mede as consultas e gera relatório ao sair
+            "slow_query_ms": 100,  # consultas acima deste tempo vão para data/slow_queries.log
+            "db_sharding": False  # um banco por usuário em data/tenants (ver database.sharding)
         }
         
         # Carrega as configurações